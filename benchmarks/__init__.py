@@ -0,0 +1,4 @@
+"""
+Benchmarks of the GPX analysis, the upload mutations, photo handling, the compact geometry and the public
+list queries, run with ``python -m benchmarks`` against a temporary test database.
+"""
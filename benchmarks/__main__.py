@@ -0,0 +1,117 @@
+"""
+Run the benchmarks and write their results as JSON, or compare two result files::
+
+    python -m benchmarks --size quick --output var/benchmarks/before.json
+    python -m benchmarks --compare var/benchmarks/before.json var/benchmarks/after.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from importlib import import_module
+from pathlib import Path
+
+SUITES = ["gpx", "geometry", "mutations", "photos", "queries"]
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(record):
+    return record["benchmark"], json.dumps(record["params"], sort_keys=True)
+
+
+def compare(baseline_path, current_path):
+    """Print the median time of every benchmark in both result files and its change."""
+    with open(baseline_path) as baseline_file, open(current_path) as current_file:
+        baseline = {_key(record): record for record in json.load(baseline_file)["results"]}
+        current = [record for record in json.load(current_file)["results"] if "seconds" in record]
+    for record in current:
+        before = baseline.get(_key(record), {}).get("seconds")
+        median = record["seconds"]["median"]
+        change = f"{median / before['median'] - 1:+7.1%}" if before and before["median"] else "    new"
+        print(f"{change}  {median * 1000:10.2f} ms  {record['benchmark']} {json.dumps(record['params'])}")
+
+
+def run(size, suites, output):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as var_root:
+        overrides = override_settings(
+            MEDIA_ROOT=os.path.join(var_root, "media"),
+            TILES_ROOT=Path(var_root, "tiles"),
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+                "gpx": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "gpx"},
+            },
+            # jobs and thumbnails are run by the benchmarks themselves
+            TRACK_PROCESSING_ASYNC=True,
+            THUMBNAIL_WORKERS=0,
+        )
+        database_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            with overrides:
+                for suite in suites:
+                    print(f"{suite}:", file=sys.stderr)
+                    for record in import_module(f"benchmarks.{suite}").run(size):
+                        seconds = record.get("seconds")
+                        summary = f"{seconds['median'] * 1000:10.2f} ms" if seconds else " " * 13
+                        print(f"  {summary}  {record['benchmark']} {json.dumps(record['params'])}", file=sys.stderr)
+                        results.append(record)
+                    call_command("flush", interactive=False, verbosity=0)
+        finally:
+            connection.creation.destroy_test_db(database_name, verbosity=0)
+
+    report = {
+        "commit": _commit(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "size": size,
+        "results": results,
+    }
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--size", choices=["quick", "default", "large"], default="default")
+    parser.add_argument("--only", choices=SUITES, action="append", help="run only this suite, may be repeated")
+    parser.add_argument("--output", help="write the results as JSON to this file instead of stdout")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two result files instead of running"
+    )
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args.size, args.only or SUITES, args.output)
+
+
+if __name__ == "__main__":
+    main()
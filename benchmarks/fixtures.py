@@ -0,0 +1,161 @@
+import io
+import math
+import random
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import RequestFactory
+from easy_thumbnails.signals import saved_file
+from PIL import Image
+
+from config.schema import schema
+from tours.models import CyclingTour, CyclingTrack, TrackPhoto
+from tours.signals.handlers import generate_aliases
+from tours.utils import geohash
+from users.models import User
+
+START_TIME = datetime(2020, 7, 1, 8, tzinfo=timezone.utc)
+
+
+def make_gpx(points, segments=1, gap_every=0, gap_seconds=600, seed=0):
+    """
+    GPX file content with ``points`` track points in ``segments`` segments, the same for the same arguments.
+    Points are 1 to 60 seconds apart with a pause of ``gap_seconds`` every ``gap_every`` points, some
+    stand still and a few miss their elevation or time.
+    """
+    rnd = random.Random(seed)
+    time = START_TIME
+    latitude, longitude, elevation = 48.1, 11.5, 500.0
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<gpx version="1.1" creator="benchmarks" xmlns="http://www.topografix.com/GPX/1/1">',
+        "<metadata><name>Benchmark</name></metadata>",
+        "<trk><name>Benchmark track</name>",
+    ]
+    per_segment = math.ceil(points / segments)
+    for index in range(points):
+        if index % per_segment == 0:
+            lines.append("<trkseg>" if index == 0 else "</trkseg><trkseg>")
+        step = 0 if rnd.random() < 0.05 else rnd.random() * 0.0002
+        latitude += step * math.cos(index / 100)
+        longitude += step * math.sin(index / 100)
+        elevation += rnd.uniform(-2, 2.2)
+        time += timedelta(seconds=rnd.choice([1, 2, 5, 60]))
+        if gap_every and index and index % gap_every == 0:
+            time += timedelta(seconds=gap_seconds)
+        ele = f"<ele>{elevation:.1f}</ele>" if rnd.random() > 0.02 else ""
+        timestamp = f"<time>{time:%Y-%m-%dT%H:%M:%SZ}</time>" if rnd.random() > 0.01 else ""
+        lines.append(f'<trkpt lat="{latitude:.7f}" lon="{longitude:.7f}">{ele}{timestamp}</trkpt>')
+    lines.append("</trkseg></trk></gpx>")
+    return "\n".join(lines).encode()
+
+
+def make_jpeg(size=(640, 480), location=(48.1, 11.5), taken_at=START_TIME, seed=0):
+    """JPEG with a noisy image of ``size`` and GPS and capture time EXIF tags, ``location`` may be ``None``."""
+    rnd = random.Random(seed)
+    image = Image.effect_noise(size, 64).convert("RGB")
+    image.paste((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)), (0, 0, size[0] // 4, size[1] // 4))
+    exif = Image.Exif()
+    exif[0x0132] = taken_at.strftime("%Y:%m:%d %H:%M:%S")
+    if location:
+        latitude, longitude = location
+
+        def dms(value):
+            value = abs(value)
+            degrees, minutes = int(value), int(value * 60 % 60)
+            return float(degrees), float(minutes), round(value * 3600 % 60, 4)
+
+        exif[0x8825] = {
+            1: "N" if latitude >= 0 else "S",
+            2: dms(latitude),
+            3: "E" if longitude >= 0 else "W",
+            4: dms(longitude),
+        }
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def execute(query, user=None, variables=None):
+    """Execute a GraphQL operation as ``user`` and return its data, errors are raised."""
+    request = RequestFactory().post("/api/v1/")
+    request.user = user or AnonymousUser()
+    result = schema.execute(query, context_value=request, variables=variables)
+    if result.errors:
+        raise result.errors[0]
+    return result.data
+
+
+@contextmanager
+def without_thumbnail_generation():
+    """Saved images do not schedule their thumbnails, so uploads are timed without rendering."""
+    saved_file.disconnect(generate_aliases)
+    try:
+        yield
+    finally:
+        saved_file.connect(generate_aliases)
+
+
+def create_user(index=0):
+    user, _ = User.objects.get_or_create(
+        email=f"benchmark{index}@example.com",
+        defaults={"name": f"Benchmark {index}", "logbook_subdomain": f"benchmark{index}"},
+    )
+    return user
+
+
+def random_locations(count, seed=0, bbox=(5.0, 45.0, 15.0, 55.0)):
+    rnd = random.Random(seed)
+    min_longitude, min_latitude, max_longitude, max_latitude = bbox
+    return [(rnd.uniform(min_longitude, max_longitude), rnd.uniform(min_latitude, max_latitude)) for _ in range(count)]
+
+
+def create_tracks(user, count, photos_per_track=0, seed=0, batch_size=1000):
+    """
+    ``count`` tracks of ``user`` in one tour with ``photos_per_track`` located photos each. Tracks are saved
+    one by one, ``bulk_create`` does not support multi-table inheritance, photos are inserted in bulk.
+    All photos share one stored JPEG, so their thumbnails are rendered once.
+    """
+    with transaction.atomic():
+        tour = CyclingTour.objects.create(
+            name="Benchmark tour",
+            start_date=date(2020, 1, 1),
+            end_date=date(2020, 12, 31),
+            owner=user,
+            type=CyclingTour.TYPE_ROAD,
+        )
+        tracks = [
+            CyclingTrack.objects.create(
+                owner=user,
+                tour=tour,
+                name=f"Benchmark track {index}",
+                start_date=date(2020, 1, 1) + timedelta(days=index % 365),
+                end_date=date(2020, 1, 1) + timedelta(days=index % 365),
+            )
+            for index in range(count)
+        ]
+    if photos_per_track:
+        photo_name = default_storage.save("benchmarks/photo.jpg", ContentFile(make_jpeg(seed=seed)))
+        locations = iter(random_locations(count * photos_per_track, seed))
+        photos = [
+            located_photo(track, photo_name, *next(locations)) for track in tracks for _ in range(photos_per_track)
+        ]
+        TrackPhoto.objects.bulk_create(photos, batch_size=batch_size)
+    return tour, tracks
+
+
+def located_photo(track, name, longitude, latitude):
+    """Unsaved photo at a location, with the geohash :meth:`TrackPhoto.save` would set."""
+    longitude, latitude = round(longitude, 5), round(latitude, 5)
+    return TrackPhoto(
+        track=track,
+        file=name,
+        longitude=longitude,
+        latitude=latitude,
+        geohash=geohash.encode(latitude, longitude),
+        taken_at=START_TIME,
+    )
@@ -0,0 +1,47 @@
+"""Size and decoding time of the GeoJSON and the compact binary track geometry."""
+import gzip
+import io
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from tours.utils import trackbin
+from tours.utils.analysis import analyze_gpx
+from tours.utils.geo import line_string_from_array
+
+from .fixtures import make_gpx
+from .timing import measure, result
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+POINTS = {"quick": [10000], "default": [10000, 100000], "large": [10000, 100000, 500000]}
+
+
+def _sizes(content):
+    sizes = {"raw": len(content), "gzip": len(gzip.compress(content, compresslevel=9))}
+    if brotli is not None:
+        sizes["br"] = len(brotli.compress(content, quality=11))
+    return sizes
+
+
+def run(size):
+    for points in POINTS[size]:
+        content = make_gpx(points, seed=points)
+        analysis = analyze_gpx(SimpleUploadedFile("track.gpx", content, "application/gpx+xml"))
+        params = {"points": points, "vertices": len(analysis.line)}
+
+        geojson = line_string_from_array(analysis.line).geojson.encode()
+        binary = trackbin.encode(analysis.line, analysis.line_elevations, analysis.line_times)
+        yield result("geometry.size", params, geojson=_sizes(geojson), binary=_sizes(binary))
+
+        yield measure("geometry.decode.geojson", lambda: json.load(io.BytesIO(geojson)), params, repeat=20)
+        yield measure("geometry.decode.binary", lambda: trackbin.decode(binary), params, repeat=20)
+        yield measure(
+            "geometry.encode.binary",
+            lambda: trackbin.encode(analysis.line, analysis.line_elevations, analysis.line_times),
+            params,
+            repeat=20,
+        )
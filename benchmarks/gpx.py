@@ -0,0 +1,74 @@
+"""GPX parsing and analysis, compared with gpxpy when it is installed (``pipenv install --dev``)."""
+import io
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from tours.utils.analysis import analyze_gpx
+from tours.utils.gpx import parse_gpx
+
+from .fixtures import make_gpx
+from .timing import measure, result
+
+try:
+    import gpxpy
+except ImportError:
+    gpxpy = None
+
+POINTS = {"quick": [1000], "default": [1000, 10000, 100000], "large": [1000, 10000, 100000, 500000]}
+VARIANTS = [{"segments": 1, "gap_every": 0}, {"segments": 10, "gap_every": 500}]
+# gpxpy needs seconds for large files
+GPXPY_MAX_POINTS = 100000
+
+STATISTICS = ["distance_m", "uphill_m", "downhill_m", "moving_time_s", "stopped_time_s", "max_speed_m_per_s"]
+
+
+def gpxpy_statistics(content):
+    """Statistics the mutations computed with gpxpy before :mod:`tours.utils.stats` replaced it."""
+    gpx = gpxpy.parse(content.decode())
+    gpx.smooth(vertical=True, horizontal=False, remove_extremes=False)
+    uphill, downhill = gpx.get_uphill_downhill()
+    moving_data = gpx.get_moving_data(speed_extreemes_percentiles=0.015)
+    return {
+        "distance_m": gpx.length_2d(),
+        "uphill_m": uphill,
+        "downhill_m": downhill,
+        "moving_time_s": moving_data.moving_time,
+        "stopped_time_s": moving_data.stopped_time,
+        "max_speed_m_per_s": moving_data.max_speed,
+    }
+
+
+def _relative_difference(value, reference):
+    if value == reference:
+        return 0.0
+    return abs(value - reference) / max(abs(reference), 1e-9)
+
+
+def run(size):
+    for points in POINTS[size]:
+        for variant in VARIANTS:
+            content = make_gpx(points, seed=points, **variant)
+            params = {"points": points, "bytes": len(content), **variant}
+            repeat = 3 if points >= 100000 else 5
+
+            yield measure("gpx.parse", lambda: parse_gpx(io.BytesIO(content)), params, repeat=repeat)
+
+            upload = SimpleUploadedFile("track.gpx", content, "application/gpx+xml")
+            yield measure("gpx.analyze", lambda: analyze_gpx(upload), params, repeat=repeat, setup=caches["gpx"].clear)
+            yield measure("gpx.analyze.cached", lambda: analyze_gpx(upload), params, repeat=repeat)
+
+            if gpxpy is None or points > GPXPY_MAX_POINTS:
+                continue
+            yield measure("gpx.analyze.gpxpy", lambda: gpxpy_statistics(content), params, repeat=1, warmup=0)
+
+            caches["gpx"].clear()
+            statistics = analyze_gpx(upload).statistics._asdict()
+            reference = gpxpy_statistics(content)
+            yield result(
+                "gpx.parity.gpxpy",
+                params,
+                relative_difference={
+                    field: _relative_difference(statistics[field], reference[field]) for field in STATISTICS
+                },
+            )
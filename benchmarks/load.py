@@ -0,0 +1,213 @@
+"""
+Load driver replaying a weighted mix of GraphQL operations against the WSGI application from many
+threads, optionally in several processes, see the ``loadtest`` management command.
+"""
+import io
+import json
+import multiprocessing
+import random
+import statistics
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.test import RequestFactory
+from graphql_jwt.shortcuts import get_token
+
+from config.wsgi import application
+from utils.thumbnails import shutdown_executor
+
+from .fixtures import create_tracks, create_user, make_gpx
+
+LOGBOOK = """
+query Logbook($subdomain: ID!, $first: Int) {
+  logbook(subdomain: $subdomain) {
+    title
+    tracks(first: $first) {
+      edges { node { id name startDate distanceKm geojson photos { url previewUrl longitude latitude } } }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+"""
+MY_TRACKS = """
+query MyTracks($first: Int) {
+  myTracks(first: $first) {
+    edges { node { id name startDate endDate distanceKm uphillM processingStatus } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+GPX_FILE_INFO = """
+mutation GPXFileInfo($file: Upload!) {
+  gpxFileInfo(file: $file) { name distanceKm uphillM downhillM startDate endDate movingTime { hours minutes } }
+}
+"""
+
+DEFAULT_MIX = {"logbook": 70, "my_tracks": 25, "gpx_file_info": 5}
+
+
+def seed(users=20, tracks_per_user=50, photos_per_track=3, gpx_files=8, gpx_points=5000):
+    """
+    Users with logbooks of located photo tracks and their JWTs, and distinct GPX files to upload.
+    Returns what the workers need as plain data, so it can be sent to other processes.
+    """
+    dataset = {"users": [], "gpx_files": [make_gpx(gpx_points, segments=2, seed=index) for index in range(gpx_files)]}
+    for index in range(users):
+        user = create_user(index)
+        if not user.track_set.exists():
+            create_tracks(user, tracks_per_user, photos_per_track=photos_per_track, seed=index)
+        dataset["users"].append({"subdomain": user.logbook_subdomain, "token": get_token(user)})
+    return dataset
+
+
+def _graphql_request(factory, query, variables, token=None, files=None):
+    headers = {"HTTP_AUTHORIZATION": f"JWT {token}"} if token else {}
+    if not files:
+        body = json.dumps({"query": query, "variables": variables})
+        return factory.post("/api/v1/", body, "application/json", **headers)
+    # GraphQL multipart request: the operation, the variables each file replaces and the files
+    data = {
+        "operations": json.dumps({"query": query, "variables": variables}),
+        "map": json.dumps({str(index): [f"variables.{name}"] for index, name in enumerate(files)}),
+    }
+    for index, (name, content) in enumerate(files.items()):
+        upload = io.BytesIO(content)
+        upload.name = f"{name}.gpx"
+        data[str(index)] = upload
+    return factory.post("/api/v1/", data, **headers)
+
+
+def build_request(operation, dataset, rnd, factory):
+    user = rnd.choice(dataset["users"])
+    if operation == "logbook":
+        return _graphql_request(factory, LOGBOOK, {"subdomain": rnd.choice(dataset["users"])["subdomain"], "first": 20})
+    if operation == "my_tracks":
+        return _graphql_request(factory, MY_TRACKS, {"first": 20}, user["token"])
+    if operation == "gpx_file_info":
+        files = {"file": rnd.choice(dataset["gpx_files"])}
+        return _graphql_request(factory, GPX_FILE_INFO, {"file": None}, user["token"], files)
+    raise ValueError(f"Unknown operation {operation}")
+
+
+def call_application(environ):
+    """Run one request through the WSGI application like a server, returns the status code and body."""
+    response_status = []
+
+    def start_response(status, headers, exc_info=None):
+        response_status.append(int(status.split(" ", 1)[0]))
+
+    response = application(environ, start_response)
+    try:
+        body = b"".join(response)
+    finally:
+        # sends request_finished, which returns the database connection
+        if hasattr(response, "close"):
+            response.close()
+    return response_status[0], body
+
+
+def _failed(status, body):
+    if status != 200:
+        return True
+    try:
+        return bool(json.loads(body).get("errors"))
+    except ValueError:
+        return True
+
+
+def _worker(dataset, mix, deadline, seed_value):
+    rnd = random.Random(seed_value)
+    factory = RequestFactory(SERVER_NAME="localhost")
+    operations, weights = list(mix), list(mix.values())
+    samples = []
+    try:
+        while time.monotonic() < deadline:
+            operation = rnd.choices(operations, weights)[0]
+            environ = build_request(operation, dataset, rnd, factory).environ
+            start = time.perf_counter()
+            status, body = call_application(environ)
+            samples.append((operation, time.perf_counter() - start, _failed(status, body)))
+    finally:
+        connections.close_all()
+    return samples
+
+
+def _run_threads(dataset, mix, duration, threads, seed_value):
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [
+            executor.submit(_worker, dataset, mix, deadline, seed_value * 1000 + index) for index in range(threads)
+        ]
+        return [sample for future in futures for sample in future.result()]
+
+
+def _run_process(pipe, *arguments):
+    try:
+        pipe.send(_run_threads(*arguments))
+    finally:
+        # the thumbnails scheduled by this process are rendered by its own pool
+        shutdown_executor()
+        pipe.close()
+
+
+def run(dataset, mix=None, duration=30.0, threads=8, processes=1, seed_value=0):
+    """
+    Replay ``mix`` (operation names to relative weights) against ``config.wsgi.application`` for
+    ``duration`` seconds from ``threads`` threads in each of ``processes`` processes. Returns
+    ``(samples, elapsed seconds)``, samples are ``(operation, seconds, failed)`` tuples.
+    """
+    mix = mix or DEFAULT_MIX
+    start = time.perf_counter()
+    if processes == 1:
+        samples = _run_threads(dataset, mix, duration, threads, seed_value)
+        return samples, time.perf_counter() - start
+
+    # children must not share the parent's database connections, they are not daemons so they can start
+    # their thumbnail pools
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    pipes, children = [], []
+    for index in range(processes):
+        receiver, sender = context.Pipe(duplex=False)
+        child = context.Process(target=_run_process, args=(sender, dataset, mix, duration, threads, seed_value + index))
+        child.start()
+        pipes.append(receiver)
+        children.append(child)
+    samples = [sample for receiver in pipes for sample in receiver.recv()]
+    # the children still wait for their thumbnails
+    elapsed = time.perf_counter() - start
+    for child in children:
+        child.join()
+    return samples, elapsed
+
+
+def percentile(sorted_values, fraction):
+    """Nearest rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+
+def summarize(samples, elapsed):
+    """Requests, errors, throughput and latency percentiles in milliseconds per operation and in total."""
+    by_operation = defaultdict(list)
+    for operation, seconds, failed in samples:
+        by_operation[operation].append((seconds, failed))
+        by_operation["total"].append((seconds, failed))
+
+    report = {}
+    for operation, values in sorted(by_operation.items(), key=lambda item: item[0] == "total"):
+        latencies = sorted(seconds * 1000 for seconds, _ in values)
+        report[operation] = {
+            "requests": len(values),
+            "errors": sum(failed for _, failed in values),
+            "requests_per_second": len(values) / elapsed,
+            "mean_ms": statistics.mean(latencies),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": latencies[-1],
+        }
+    return report
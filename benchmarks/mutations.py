@@ -0,0 +1,63 @@
+"""The GPX upload mutations and the track processing job they queue."""
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from tours.processing import process_next_job
+
+from .fixtures import create_user, execute, make_gpx, make_jpeg, without_thumbnail_generation
+from .timing import measure
+
+POINTS = {"quick": [1000], "default": [1000, 10000], "large": [1000, 10000, 100000]}
+PHOTOS = {"quick": [0, 2], "default": [0, 4], "large": [0, 4, 16]}
+
+GPX_FILE_INFO = """
+mutation GPXFileInfo($file: Upload!) {
+  gpxFileInfo(file: $file) {
+    name distanceKm uphillM downhillM startDate endDate maxSpeedKmPerH avgSpeedKmPerH
+    movingTime { hours minutes } stoppedTime { hours minutes }
+  }
+}
+"""
+TRACK_CREATE = """
+mutation TrackCreate($file: Upload, $photos: [Upload]) {
+  trackCreate(name: "Benchmark", startDate: "2020-07-01", endDate: "2020-07-01", gpxFile: $file, photos: $photos) {
+    id
+  }
+}
+"""
+
+
+def _upload(name, content, content_type):
+    return SimpleUploadedFile(name, content, content_type)
+
+
+def run(size):
+    user = create_user()
+    photo = make_jpeg(size=(1600, 1200))
+
+    for points in POINTS[size]:
+        content = make_gpx(points, segments=2, gap_every=200, seed=points)
+        params = {"points": points}
+
+        def gpx_file_info():
+            execute(GPX_FILE_INFO, user, {"file": _upload("track.gpx", content, "application/gpx+xml")})
+
+        yield measure("mutation.gpxFileInfo", gpx_file_info, params, setup=caches["gpx"].clear)
+        yield measure("mutation.gpxFileInfo.cached", gpx_file_info, params)
+
+        for photo_count in PHOTOS[size]:
+            params = {"points": points, "photos": photo_count}
+
+            def track_create():
+                photos = [_upload(f"photo{index}.jpg", photo, "image/jpeg") for index in range(photo_count)]
+                execute(
+                    TRACK_CREATE, user, {"file": _upload("track.gpx", content, "application/gpx+xml"), "photos": photos}
+                )
+
+            with without_thumbnail_generation():
+                # the GPX analysis of gpxFileInfo is cached, like in the upload flow of the frontend
+                yield measure("mutation.trackCreate", track_create, params)
+                while process_next_job():
+                    pass
+                # the track created by the setup is the only queued one
+                yield measure("processing.track", process_next_job, params, setup=track_create)
@@ -0,0 +1,135 @@
+"""Photo uploads, EXIF reading, thumbnails and the geohash location queries at several photo counts."""
+import io
+import random
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.models import Thumbnail
+
+from tours.models import TrackPhoto
+from tours.utils import geohash
+from tours.utils.exif import read_exif
+from utils.thumbnails import render_thumbnail
+
+from .fixtures import (
+    create_tracks,
+    create_user,
+    located_photo,
+    make_jpeg,
+    random_locations,
+    without_thumbnail_generation,
+)
+from .timing import measure, result
+
+try:
+    import exif
+except ImportError:
+    exif = None
+
+IMAGE_SIZES = {"quick": [(1600, 1200)], "default": [(1600, 1200), (4000, 3000)], "large": [(1600, 1200), (6000, 4500)]}
+PHOTO_COUNTS = {"quick": [10000], "default": [10000, 100000], "large": [10000, 100000, 1000000]}
+# a city, a region and a country sized map view around the center of the generated photos
+BOXES = [0.05, 0.5, 5.0]
+CENTER = (10.0, 50.0)
+
+
+def exif_library_location(content):
+    """Location as the ``exif`` package reads it from the whole file, which :mod:`tours.utils.exif` replaced."""
+    image = exif.Image(content)
+    return image.get("gps_longitude"), image.get("gps_latitude")
+
+
+def _uploads(size):
+    user = create_user()
+    _, (track,) = create_tracks(user, 1)
+    for width, height in IMAGE_SIZES[size]:
+        content = make_jpeg(size=(width, height), seed=width)
+        params = {"width": width, "height": height, "bytes": len(content)}
+
+        def save():
+            photo = TrackPhoto(track=track, file=SimpleUploadedFile("photo.jpg", content, "image/jpeg"))
+            photo.save()
+
+        with without_thumbnail_generation():
+            yield measure("photo.save", save, params)
+
+        yield measure("photo.exif", lambda: read_exif(io.BytesIO(content)), params, repeat=20)
+        if exif is not None:
+            yield measure("photo.exif.library", lambda: exif_library_location(content), params, repeat=20)
+
+        photo = TrackPhoto.objects.filter(track=track).last()
+        thumbnailer = get_thumbnailer(default_storage, photo.file.name)
+        for alias, options in sorted(aliases.all(photo.file, include_global=True).items()):
+            options = thumbnailer.get_options(dict(options, ALIAS=alias))
+            yield measure(
+                "photo.thumbnail",
+                lambda: render_thumbnail(photo.file.name, options),
+                {**params, "alias": alias},
+                setup=lambda: _delete_thumbnail(thumbnailer.get_thumbnail_name(options)),
+            )
+
+
+def _delete_thumbnail(name):
+    """Remove a thumbnail and its cache entry, so it is rendered again."""
+    Thumbnail.objects.filter(name=name).delete()
+    default_storage.delete(name)
+
+
+def _brute_force_nearest(photos, longitude, latitude, count):
+    return sorted(
+        photos, key=lambda photo: geohash.distance(latitude, longitude, float(photo.latitude), float(photo.longitude))
+    )[:count]
+
+
+def _locations(size):
+    user = create_user()
+    _, (track,) = create_tracks(user, 1)
+    inserted = 0
+    for count in PHOTO_COUNTS[size]:
+        locations = random_locations(count - inserted, seed=count)
+        TrackPhoto.objects.bulk_create(
+            (located_photo(track, "benchmarks/photo.jpg", *location) for location in locations), batch_size=5000
+        )
+        inserted = count
+        params = {"photos": count}
+
+        for extent in BOXES:
+            box = (CENTER[0] - extent, CENTER[1] - extent / 2, CENTER[0] + extent, CENTER[1] + extent / 2)
+            box_params = {**params, "extent": extent}
+            yield measure(
+                "photos.bbox",
+                lambda: list(TrackPhoto.objects.filter(TrackPhoto.in_bbox(*box)).order_by("geohash", "id")[:100]),
+                box_params,
+            )
+            # the same page without the geohash cells, answered by a scan of the coordinates
+            yield measure(
+                "photos.bbox.coordinates",
+                lambda: list(
+                    TrackPhoto.objects.filter(
+                        longitude__gte=box[0], longitude__lte=box[2], latitude__gte=box[1], latitude__lte=box[3]
+                    ).order_by("geohash", "id")[:100]
+                ),
+                box_params,
+            )
+
+        rnd = random.Random(count)
+        points = [(rnd.uniform(6, 14), rnd.uniform(46, 54)) for _ in range(5)]
+        yield measure("photos.nearest", lambda: [TrackPhoto.nearest(*point, 10) for point in points], params)
+        if count <= 100000:
+            all_photos = list(TrackPhoto.objects.filter(geohash__isnull=False).only("id", "longitude", "latitude"))
+            yield measure(
+                "photos.nearest.brute_force",
+                lambda: [_brute_force_nearest(all_photos, *point, 10) for point in points],
+                params,
+                repeat=1,
+            )
+            expected = [[photo.pk for photo in _brute_force_nearest(all_photos, *point, 10)] for point in points]
+            found = [[photo.pk for photo in TrackPhoto.nearest(*point, 10)] for point in points]
+            yield result("photos.nearest.parity", params, matches=expected == found)
+
+
+def run(size):
+    yield from _uploads(size)
+    yield from _locations(size)
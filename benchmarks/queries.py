@@ -0,0 +1,63 @@
+"""The public list queries of the map and the logbook through the whole GraphQL view."""
+import json
+
+from django.test import Client, override_settings
+
+from .fixtures import create_tracks, create_user
+from .timing import measure
+
+TRACK_COUNTS = {"quick": [100], "default": [100, 1000], "large": [100, 1000, 10000]}
+PHOTOS_PER_TRACK = 3
+PAGE_SIZE = 50
+
+TRACK_FIELDS = """
+fragment TrackFields on TrackType {
+  id name startDate endDate distanceKm uphillM downhillM geojson
+  owner { id name }
+  photos { url previewUrl longitude latitude takenAt }
+}
+"""
+QUERIES = {
+    "tracks": """
+query Tracks($first: Int) {
+  tracks(first: $first) { edges { node { ...TrackFields } } pageInfo { hasNextPage endCursor } }
+}
+""",
+    "logbook": """
+query Logbook($subdomain: ID!, $first: Int) {
+  logbook(subdomain: $subdomain) {
+    title
+    tracks(first: $first) { edges { node { ...TrackFields } } pageInfo { hasNextPage endCursor } }
+  }
+}
+""",
+}
+
+
+def _post(client, query, variables):
+    response = client.post(
+        "/api/v1/", json.dumps({"query": query + TRACK_FIELDS, "variables": variables}), "application/json"
+    )
+    content = json.loads(response.content)
+    if response.status_code != 200 or content.get("errors"):
+        raise RuntimeError(f"{response.status_code}: {content}")
+    return response
+
+
+def run(size):
+    client = Client()
+    total = 0
+    for index, count in enumerate(TRACK_COUNTS[size]):
+        # every count is the logbook of its own user, the tracks query pages through the tracks of all of them
+        user = create_user(index)
+        create_tracks(user, count, photos_per_track=PHOTOS_PER_TRACK, seed=count)
+        total += count
+        variables = {"subdomain": user.logbook_subdomain, "first": PAGE_SIZE}
+        params = {"tracks": count, "total_tracks": total, "photos_per_track": PHOTOS_PER_TRACK, "first": PAGE_SIZE}
+
+        for name, query in QUERIES.items():
+            with override_settings(GRAPHQL_RESPONSE_CACHE_TIMEOUT=0):
+                yield measure(f"query.{name}", lambda: _post(client, query, variables), params)
+            # the benchmarks run in one process, so the local memory cache can be used
+            with override_settings(GRAPHQL_RESPONSE_CACHE_TIMEOUT=300):
+                yield measure(f"query.{name}.cached", lambda: _post(client, query, variables), params)
@@ -0,0 +1,50 @@
+import statistics
+import time
+
+from django.db import connection
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(name, function, params=None, repeat=5, warmup=1, setup=None, **extra):
+    """
+    Time ``function`` ``repeat`` times after ``warmup`` untimed calls, calling ``setup`` untimed before each.
+    Returns a result record with the min, median and mean seconds and the database queries per call.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        function()
+
+    timings = []
+    counter = _QueryCounter()
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+    return result(
+        name,
+        params,
+        seconds={
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "mean": statistics.mean(timings),
+        },
+        repeat=repeat,
+        queries=counter.count / repeat,
+        **extra,
+    )
+
+
+def result(name, params=None, **values):
+    return {"benchmark": name, "params": params or {}, **values}
@@ -19,6 +19,11 @@ env = environ.Env(
     # set casting, default value
     DEBUG=(bool, False),
     ALLOWED_HOSTS=(list, []),
+    TRACK_PROCESSING_ASYNC=(bool, True),
+    THUMBNAIL_WORKERS=(int, 2),
+    GRAPHQL_RESPONSE_CACHE_TIMEOUT=(int, 300),
+    LAST_LOGIN_FLUSH_INTERVAL=(int, 60),
+    METRICS_TOKEN=(str, ""),
 )
 
 # reading .env file
@@ -130,10 +135,36 @@ MEDIA_URL = env("MEDIA_URL")
 STATIC_ROOT = MEDIA_ROOT.joinpath("static")
 STATIC_URL = env("STATIC_URL")
 
+# Cached vector tiles, see tours.tiles, expired tiles are rendered again and deleted by the prune_tiles command
+TILES_ROOT = VAR_ROOT.joinpath("tiles")
+TILES_MAX_ZOOM = 18
+TILES_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+# Caches
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    "default": env.cache(default="locmemcache://"),
+    # GPX analysis results by file hash, shared by all workers on the host
+    "gpx": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": str(VAR_ROOT.joinpath("cache", "gpx")),
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+
+# Caches invalidated by other workers (responses) need a backend shared by all of them, like
+# Redis or Memcached. With a per process backend, the default, they are disabled.
+SHARED_CACHE = CACHES["default"]["BACKEND"] not in [
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+]
+
 AUTH_USER_MODEL = "users.User"
 
 AUTHENTICATION_BACKENDS = [
-    "graphql_jwt.backends.JSONWebTokenBackend",
+    "users.backends.CachedJSONWebTokenBackend",
     "django.contrib.auth.backends.ModelBackend",
 ]
 
@@ -146,7 +177,53 @@ THUMBNAIL_ALIASES = {
     },
 }
 
-GRAPHENE = {"SCHEMA": "config.schema.schema", "MIDDLEWARE": ["graphql_jwt.middleware.JSONWebTokenMiddleware"]}
+# Processes rendering thumbnails in the background, 0 renders them in the requesting process
+THUMBNAIL_WORKERS = env("THUMBNAIL_WORKERS")
+
+GRAPHENE = {
+    "SCHEMA": "config.schema.schema",
+    "MIDDLEWARE": ["graphql_jwt.middleware.JSONWebTokenMiddleware", "utils.metrics.MetricsMiddleware"],
+}
+
+# Prometheus metrics at /metrics, only served with this bearer token, or to anyone with DEBUG.
+# Workers add up their metrics through files in METRICS_DIR, empty for a single worker, see utils.metrics.
+METRICS_TOKEN = env("METRICS_TOKEN")
+METRICS_DIR = env("METRICS_DIR", default=str(VAR_ROOT.joinpath("metrics")))
+METRICS_WRITE_INTERVAL = 1
+
+# Responses of anonymous public queries, invalidated by model signals. The timeout bounds how long
+# original image urls are served before the thumbnails are rendered, 0 disables the cache.
+# Needs a cache shared by all workers, see SHARED_CACHE.
+GRAPHQL_RESPONSE_CACHE = "default"
+GRAPHQL_RESPONSE_CACHE_TIMEOUT = env("GRAPHQL_RESPONSE_CACHE_TIMEOUT") if SHARED_CACHE else 0
+
+# Parsed and validated GraphQL documents kept per process
+GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+# Queries registered by clients sending automatic persisted queries, anyone can register them, so they
+# expire (clients register them again) and larger ones are rejected
+GRAPHQL_PERSISTED_QUERY_CACHE = "default"
+GRAPHQL_PERSISTED_QUERY_TIMEOUT = 24 * 60 * 60
+GRAPHQL_PERSISTED_QUERY_MAX_LENGTH = 10000
+
+# Static query cost analysis, operations over the limits are rejected before execution. Fields cost their
+# weight ("Type.field", default 1 for objects, 0 for scalars) per parent object, lists without `first`
+# are assumed to have GRAPHQL_LIST_SIZE items.
+GRAPHQL_MAX_QUERY_DEPTH = 10
+GRAPHQL_MAX_QUERY_COST = 10000
+GRAPHQL_LIST_SIZE = 10
+GRAPHQL_FIELD_COSTS = {
+    "PhotoType.iconUrl": 5,
+    "PhotoType.previewUrl": 5,
+    "UserPublicType.profileImage": 5,
+    "UserPublicType.logbookHeaderImage": 5,
+    "UserPrivateType.profileImage": 5,
+    "UserPrivateType.logbookHeaderImage": 5,
+    "Logbook.headerImage": 5,
+    # up to tours.clusters.MAX_CLUSTERS aggregated cells
+    "Query.photoClusters": 1000,
+    "Mutation.gpxFileInfo": 2500,
+    "Mutation.trackCreate": 2500,
+}
 
 GRAPHQL_JWT = {
     "JWT_VERIFY_EXPIRATION": True,
@@ -154,6 +231,10 @@ GRAPHQL_JWT = {
     "JWT_REFRESH_EXPIRATION_DELTA": timedelta(days=365),
 }
 
+# Seconds logins are buffered per process before their last_login is written in one update, which is
+# also the resolution of last_login, see users.last_login. 0 writes every login right away.
+LAST_LOGIN_FLUSH_INTERVAL = env("LAST_LOGIN_FLUSH_INTERVAL")
+
 # Track / Tour Photos
 PHOTO_ALLOWED_CONTENT_TYPES = ["image/jpeg"]
 PHOTO_MAX_FILESIZE_BYTES = 15 * 1024 * 1024
@@ -161,3 +242,13 @@ PHOTO_MAX_FILESIZE_BYTES = 15 * 1024 * 1024
 # Profile, header images
 IMAGE_ALLOWED_CONTENT_TYPES = ["image/jpeg", "image/png"]
 IMAGE_MAX_FILESIZE_BYTES = 15 * 1024 * 1024
+
+# Track processing, run by `manage.py process_tracks` unless disabled
+TRACK_PROCESSING_ASYNC = env("TRACK_PROCESSING_ASYNC")
+TRACK_PROCESSING_MAX_ATTEMPTS = 3
+# seconds after which a running job is considered abandoned by its worker and claimed again
+TRACK_PROCESSING_TIMEOUT = 600
+
+# Connection pagination
+PAGINATION_DEFAULT_PAGE_SIZE = 50
+PAGINATION_MAX_PAGE_SIZE = 100
@@ -17,11 +17,16 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import path, re_path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_file_upload.django import FileUploadGraphQLView
+
+from config.views import CachedGraphQLView, document_backend, metrics
+from tours.views import geometry_asset, track_tile
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/v1/", csrf_exempt(FileUploadGraphQLView.as_view(graphiql=True))),
+    path("api/v1/", csrf_exempt(CachedGraphQLView.as_view(graphiql=True, backend=document_backend))),
+    path("tiles/<int:z>/<int:x>/<int:y>.mvt", track_tile, name="track-tile"),
+    path("geometry/<str:name>", geometry_asset, name="geometry-asset"),
+    path("metrics", metrics, name="metrics"),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,237 @@
+import hashlib
+import json
+
+from django.conf import settings as s
+from django.contrib.auth import authenticate
+from django.core.cache import caches
+from django.db import connection
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from graphene_django.views import HttpError
+from graphene_file_upload.django import FileUploadGraphQLView
+from graphql.error import GraphQLSyntaxError
+from graphql.execution import ExecutionResult
+from graphql.language import ast
+from graphql.language.printer import print_ast
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_http_authorization
+
+from tours.models import Tour, Track
+from users.models import User
+from utils import response_cache
+from utils.graphene import get_argument_value
+from utils.graphql_backend import CachedDocumentBackend
+from utils.metrics import OperationMetrics
+from utils.metrics import render as render_metrics
+from utils.query_cost import check_query_cost, get_operation
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# request header asking for the metrics of the operation in the response extensions
+METRICS_HEADER = "HTTP_X_GRAPHQL_METRICS"
+
+# parsed and validated documents of this process, shared by all requests
+document_backend = CachedDocumentBackend(s.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+
+def _owner_of(queryset, **lookup):
+    try:
+        return queryset.filter(**lookup).values_list("owner_id", flat=True).first()
+    except (ValueError, TypeError):
+        return None
+
+
+def _tour_scope(field, variables):
+    return _owner_of(Tour.objects, pk=get_argument_value(field, "id", variables))
+
+
+def _track_scope(field, variables):
+    return _owner_of(Track.objects, pk=get_argument_value(field, "id", variables))
+
+
+def _user_scope(field, variables):
+    try:
+        return int(get_argument_value(field, "id", variables))
+    except (ValueError, TypeError):
+        return None
+
+
+def _logbook_scope(field, variables):
+    subdomain = get_argument_value(field, "subdomain", variables)
+    return User.objects.filter(logbook_subdomain=subdomain).values_list("pk", flat=True).first()
+
+
+# public root fields whose responses can be cached, with the owner they belong to or None for listings
+PUBLIC_FIELDS = {
+    "tour": _tour_scope,
+    "tours": lambda field, variables: None,
+    "track": _track_scope,
+    "tracks": lambda field, variables: None,
+    "user": _user_scope,
+    "logbook": _logbook_scope,
+    "__typename": lambda field, variables: None,
+}
+
+
+class CachedGraphQLView(FileUploadGraphQLView):
+    """
+    GraphQL view answering anonymous queries of :data:`PUBLIC_FIELDS` from the response cache.
+    Single objects are cached per owner, everything else under the global scope, both are
+    invalidated by the model signals through :func:`utils.response_cache.invalidate_owner`.
+    """
+
+    def get_cache_params(self, request, data):
+        """Normalized query, variables, operation name and cache scopes, ``None`` if the response is not cacheable."""
+        if not s.GRAPHQL_RESPONSE_CACHE_TIMEOUT or self.wants_metrics(request):
+            return None
+        if request.user.is_authenticated or get_http_authorization(request):
+            return None
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        if not query:
+            return None
+        try:
+            document = self.get_backend(request).document_from_string(self.schema, query).document_ast
+        except GraphQLSyntaxError:
+            return None
+
+        operation = get_operation(document, operation_name)
+        if operation is None or operation.operation != "query":
+            return None
+
+        scopes = set()
+        for selection in operation.selection_set.selections:
+            if not isinstance(selection, ast.Field) or selection.name.value not in PUBLIC_FIELDS:
+                return None
+            owner_id = PUBLIC_FIELDS[selection.name.value](selection, variables)
+            scopes.add(response_cache.GLOBAL_SCOPE if owner_id is None else response_cache.owner_scope(owner_id))
+        return print_ast(document), variables, operation_name, scopes
+
+    def get_persisted_query(self, request, data):
+        """
+        Query of an automatic persisted query request, the ``sha256Hash`` of the ``persistedQuery`` extension
+        is looked up or, if the query is sent along, registered for ``GRAPHQL_PERSISTED_QUERY_TIMEOUT`` seconds.
+        """
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if not extensions:
+            return None
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted_query = extensions.get("persistedQuery") if isinstance(extensions, dict) else None
+        if not persisted_query:
+            return None
+        if persisted_query.get("version") != 1:
+            raise HttpError(HttpResponseBadRequest("Unsupported persisted query version."))
+
+        digest = str(persisted_query.get("sha256Hash", "")).lower()
+        key = f"graphql-persisted-query:{digest}"
+        query = request.GET.get("query") or data.get("query")
+        if query:
+            if len(query) > s.GRAPHQL_PERSISTED_QUERY_MAX_LENGTH:
+                raise HttpError(HttpResponseBadRequest("Persisted query is too large."))
+            if hashlib.sha256(query.encode()).hexdigest() != digest:
+                raise HttpError(HttpResponseBadRequest("Provided sha256Hash does not match query."))
+            caches[s.GRAPHQL_PERSISTED_QUERY_CACHE].set(key, query, timeout=s.GRAPHQL_PERSISTED_QUERY_TIMEOUT)
+            return query
+
+        query = caches[s.GRAPHQL_PERSISTED_QUERY_CACHE].get(key)
+        if query is None:
+            # clients retry with the full query on this error
+            raise HttpError(HttpResponse(status=200), "PersistedQueryNotFound")
+        return query
+
+    def get_response(self, request, data, show_graphiql=False):
+        query = self.get_persisted_query(request, data)
+        if query is not None:
+            data = data.copy()
+            data["query"] = query
+
+        params = None if self.batch or show_graphiql else self.get_cache_params(request, data)
+        if params is None:
+            result, status_code = super().get_response(request, data, show_graphiql)
+            return self.add_metrics_extension(request, result, show_graphiql), status_code
+
+        # the key is taken before executing, rows changed meanwhile are stored under an old generation
+        key = response_cache.response_key(*params, pretty=bool(self.pretty or request.GET.get("pretty")))
+        cached = response_cache.get_response(key)
+        request.graphql_cache_status = "HIT" if cached else "MISS"
+        if cached:
+            return cached
+
+        result, status_code = super().get_response(request, data, show_graphiql)
+        if status_code == 200:
+            response_cache.set_response(key, (result, status_code))
+        return result, status_code
+
+    @staticmethod
+    def wants_metrics(request):
+        """Whether the metrics header was sent by a staff user or in debug mode, it is ignored for everyone else."""
+        if not request.META.get(METRICS_HEADER):
+            return False
+        if s.DEBUG:
+            return True
+        user = request.user
+        if not user.is_authenticated and get_http_authorization(request):
+            # JWT users are only set by the GraphQL middleware, the token backend remembers them for it
+            try:
+                user = authenticate(request=request) or user
+            except JSONWebTokenError:
+                # reported by the middleware
+                return False
+        return user.is_staff
+
+    def add_metrics_extension(self, request, result, show_graphiql):
+        """Add the metrics of the operation to the response if they were asked for, see :meth:`wants_metrics`."""
+        metrics = getattr(request, "graphql_metrics", None)
+        if result is None or metrics is None or not self.wants_metrics(request):
+            return result
+        response = json.loads(result)
+        response.setdefault("extensions", {})["metrics"] = metrics.as_extension()
+        return self.json_encode(request, response, pretty=show_graphiql)
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        document = operation = None
+        if query:
+            try:
+                document = self.get_backend(request).document_from_string(self.schema, query)
+            except Exception:
+                # reported by the base class
+                pass
+        if document is not None:
+            operation = get_operation(document.document_ast, operation_name)
+            # reject expensive operations before any resolver runs
+            errors = check_query_cost(self.schema, document.document_ast, operation_name, variables)
+            if errors:
+                return ExecutionResult(errors=errors, invalid=True)
+
+        metrics = request.graphql_metrics = OperationMetrics(fields=self.wants_metrics(request))
+        result = None
+        try:
+            with connection.execute_wrapper(metrics):
+                result = super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        finally:
+            if operation is None:
+                name, operation_type = operation_name or "anonymous", "invalid"
+            else:
+                name, operation_type = operation.name.value if operation.name else "anonymous", operation.operation
+            metrics.record(name, operation_type, result is None or bool(result.errors))
+        return result
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        status = getattr(request, "graphql_cache_status", None)
+        if status:
+            response["X-Cache"] = status
+        return response
+
+
+def metrics(request):
+    """Metrics of all workers in the Prometheus text format, behind the ``METRICS_TOKEN`` bearer token."""
+    if s.METRICS_TOKEN:
+        allowed = constant_time_compare(request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {s.METRICS_TOKEN}")
+    else:
+        allowed = s.DEBUG
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
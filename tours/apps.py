@@ -1,3 +1,5 @@
+import mimetypes
+
 from django.apps import AppConfig
 
 
@@ -6,3 +8,8 @@ class ToursConfig(AppConfig):
 
     def ready(self):
         import tours.signals.handlers  # noqa
+
+        from .utils import trackbin
+
+        # content type of the compact geometry files when served by django
+        mimetypes.add_type(trackbin.CONTENT_TYPE, trackbin.EXTENSION)
@@ -0,0 +1,71 @@
+import gzip
+import hashlib
+import re
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional
+    brotli = None
+
+# geometry files named by track and content hash, they never change once written
+ASSETS_DIR = "uploads/tours/geometry"
+ASSET_NAME = re.compile(r"^(?P<prefix>[\w.-]+)-(?P<digest>[0-9a-f]{20})(?P<extension>\.\w+)$")
+
+# Content-Encoding and file suffix of the precompressed variants, in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def _save(name, content):
+    """
+    Store ``content`` as ``name``. A file of the same size is the same content, the name contains its hash,
+    a file of another size is left over from a failed attempt and replaced.
+    """
+    if default_storage.exists(name):
+        if default_storage.size(name) == len(content):
+            return
+        default_storage.delete(name)
+    saved = default_storage.save(name, ContentFile(content))
+    if saved != name:
+        # a concurrent job stored the same content in the meantime, drop the copy with the suffixed name
+        default_storage.delete(saved)
+
+
+def save_asset(prefix, content, extension):
+    """
+    Store ``content`` as ``<prefix>-<content hash><extension>`` together with its gzip and brotli variants
+    and return the storage name. Content that was stored before is not written again.
+    """
+    digest = hashlib.sha256(content).hexdigest()[:20]
+    name = f"{ASSETS_DIR}/{prefix}-{digest}{extension}"
+    if default_storage.exists(name) and default_storage.size(name) == len(content):
+        return name
+
+    # variants first, a complete asset always has all of them
+    _save(f"{name}.gz", gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _save(f"{name}.br", brotli.compress(content, quality=11))
+    _save(name, content)
+    return name
+
+
+def delete_asset_variants(name):
+    if not name or not name.startswith(f"{ASSETS_DIR}/"):
+        return
+    for _, suffix in ENCODINGS:
+        if default_storage.exists(f"{name}{suffix}"):
+            default_storage.delete(f"{name}{suffix}")
+
+
+def get_asset_url(fieldfile, request):
+    """Url of a file saved with :func:`save_asset` through the asset view, other files are served as media."""
+    if not fieldfile.name:
+        return None
+    if fieldfile.name.startswith(f"{ASSETS_DIR}/"):
+        url = reverse("geometry-asset", kwargs={"name": fieldfile.name[len(ASSETS_DIR) + 1 :]})
+    else:
+        url = fieldfile.url
+    return request.build_absolute_uri(url)
@@ -0,0 +1,117 @@
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+
+from .models import PhotoCluster
+from .utils import geohash
+
+# pixels a cluster should span at least
+CLUSTER_SIZE_PX = 64
+# clusters returned at most, larger boxes get a coarser grid
+MAX_CLUSTERS = 1000
+
+Cluster = namedtuple("Cluster", ["cell", "count", "latitude", "longitude"])
+
+
+def precision_for_zoom(zoom):
+    """Longest geohash precision whose cells are at least :data:`CLUSTER_SIZE_PX` wide at web map ``zoom``."""
+    min_width = CLUSTER_SIZE_PX * 360 / (256 * 2 ** zoom)
+    for precision in range(PhotoCluster.MAX_PRECISION, 0, -1):
+        if geohash.cell_size(precision)[1] >= min_width:
+            return precision
+    return 1
+
+
+def precision_for_box(zoom, min_longitude, min_latitude, max_longitude, max_latitude):
+    """:func:`precision_for_zoom`, lowered until the grid has at most :data:`MAX_CLUSTERS` cells within the box."""
+    precision = precision_for_zoom(zoom)
+    while precision > 1:
+        rows, columns = geohash.grid_size(min_latitude, min_longitude, max_latitude, max_longitude, precision)
+        if rows * columns <= MAX_CLUSTERS:
+            break
+        precision -= 1
+    return precision
+
+
+def _cells(location):
+    return {precision: location[0][:precision] for precision in range(1, PhotoCluster.MAX_PRECISION + 1)}
+
+
+def _add(owner_id, location, sign):
+    """Add (``sign`` 1) or remove (``sign`` -1) a ``(geohash, latitude, longitude)`` location to the cells it is in."""
+    _, latitude, longitude = location
+    cells = _cells(location)
+    in_cells = Q()
+    for precision, cell in cells.items():
+        in_cells |= Q(precision=precision, cell=cell)
+    rows = PhotoCluster.objects.filter(in_cells, owner_id=owner_id)
+    changes = {
+        "count": F("count") + sign,
+        "latitude_sum": F("latitude_sum") + sign * latitude,
+        "longitude_sum": F("longitude_sum") + sign * longitude,
+    }
+
+    if sign < 0:
+        rows.update(**changes)
+        rows.filter(count__lte=0).delete()
+        return
+
+    if rows.update(**changes) == len(cells):
+        return
+    existing = set(rows.values_list("precision", flat=True))
+    for precision, cell in cells.items():
+        if precision in existing:
+            continue
+        try:
+            with transaction.atomic():
+                PhotoCluster.objects.create(
+                    owner_id=owner_id,
+                    precision=precision,
+                    cell=cell,
+                    count=1,
+                    latitude_sum=latitude,
+                    longitude_sum=longitude,
+                )
+        except IntegrityError:
+            # created by a concurrent request since the update above
+            PhotoCluster.objects.filter(owner_id=owner_id, precision=precision, cell=cell).update(**changes)
+
+
+def update_photo_clusters(owner_id, previous, current):
+    """
+    Move a photo of ``owner_id`` in the cluster cells from its ``previous`` to its ``current`` location,
+    both ``(geohash, latitude, longitude)`` tuples or ``None`` for photos without a location.
+    """
+    if previous == current:
+        return
+    if previous and previous[0]:
+        _add(owner_id, previous, -1)
+    if current and current[0]:
+        _add(owner_id, current, 1)
+
+
+def get_photo_clusters(zoom, min_longitude, min_latitude, max_longitude, max_latitude, owner_id=None):
+    """
+    Clusters of the grid matching ``zoom`` whose cells intersect the box, of one or all owners.
+    At most :data:`MAX_CLUSTERS`, boxes larger than the map at ``zoom`` get a coarser grid.
+    """
+    precision = precision_for_box(zoom, min_longitude, min_latitude, max_longitude, max_latitude)
+    prefixes = {cell[:precision] for cell in geohash.cover(min_latitude, min_longitude, max_latitude, max_longitude)}
+    in_box = Q()
+    for prefix in prefixes:
+        in_box |= Q(cell__startswith=prefix)
+
+    clusters = PhotoCluster.objects.filter(in_box, precision=precision)
+    if owner_id is not None:
+        clusters = clusters.filter(owner_id=owner_id)
+    rows = (
+        clusters.order_by("cell")
+        .values("cell")
+        .annotate(total=Sum("count"), latitudes=Sum("latitude_sum"), longitudes=Sum("longitude_sum"))
+    )
+    return [
+        Cluster(row["cell"], row["total"], row["latitudes"] / row["total"], row["longitudes"] / row["total"])
+        for row in rows
+        if row["total"] > 0
+    ]
@@ -0,0 +1,52 @@
+from collections import defaultdict
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from .models import MonthlyTrackStats, TourTrackStats, TrackGeometry, TrackPhoto, UserTrackStats
+
+
+class TrackPhotosLoader(DataLoader):
+    """Loads the photos of many tracks with a single query, keyed by track id."""
+
+    def batch_load_fn(self, track_ids):
+        photos = defaultdict(list)
+        for photo in TrackPhoto.objects.filter(track_id__in=track_ids).order_by("pk"):
+            photos[photo.track_id].append(photo)
+        return Promise.resolve([photos[track_id] for track_id in track_ids])
+
+
+class TrackGeometriesLoader(DataLoader):
+    """Loads the level of detail geometries of many tracks, from fine to coarse, keyed by track id."""
+
+    def batch_load_fn(self, track_ids):
+        geometries = defaultdict(list)
+        for geometry in TrackGeometry.objects.filter(track_id__in=track_ids).order_by("tolerance"):
+            geometries[geometry.track_id].append(geometry)
+        return Promise.resolve([geometries[track_id] for track_id in track_ids])
+
+
+class UserTrackStatsLoader(DataLoader):
+    """Loads the track totals of many users, keyed by user id. Users without tracks get zero totals."""
+
+    def batch_load_fn(self, user_ids):
+        stats = UserTrackStats.objects.in_bulk(user_ids, field_name="owner_id")
+        return Promise.resolve([stats.get(user_id) or UserTrackStats(owner_id=user_id) for user_id in user_ids])
+
+
+class TourTrackStatsLoader(DataLoader):
+    """Loads the track totals of many tours, keyed by tour id. Tours without tracks get zero totals."""
+
+    def batch_load_fn(self, tour_ids):
+        stats = TourTrackStats.objects.in_bulk(tour_ids, field_name="tour_id")
+        return Promise.resolve([stats.get(tour_id) or TourTrackStats(tour_id=tour_id) for tour_id in tour_ids])
+
+
+class MonthlyTrackStatsLoader(DataLoader):
+    """Loads the monthly track totals of many users, oldest first, keyed by user id."""
+
+    def batch_load_fn(self, user_ids):
+        months = defaultdict(list)
+        for month in MonthlyTrackStats.objects.filter(owner_id__in=user_ids).order_by("year", "month"):
+            months[month.owner_id].append(month)
+        return Promise.resolve([months[user_id] for user_id in user_ids])
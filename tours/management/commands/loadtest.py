@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings as s
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from benchmarks import load
+from utils.thumbnails import shutdown_executor
+
+
+def parse_mix(value):
+    """``logbook=70,my_tracks=25`` to operation weights."""
+    mix = {}
+    for item in value.split(","):
+        operation, _, weight = item.partition("=")
+        if operation not in load.DEFAULT_MIX or not weight.isdigit():
+            raise CommandError(f"Invalid mix entry {item!r}, operations are {', '.join(load.DEFAULT_MIX)}")
+        mix[operation] = int(weight)
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a temporary test database and replays a weighted mix of GraphQL operations against the WSGI "
+        "application from many threads, reports throughput and latency percentiles per operation"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds to replay traffic")
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent clients per process")
+        parser.add_argument("--processes", type=int, default=1, help="Processes replaying traffic")
+        parser.add_argument(
+            "--mix",
+            type=parse_mix,
+            default=load.DEFAULT_MIX,
+            help="Operation weights, default %s" % ",".join(f"{k}={v}" for k, v in load.DEFAULT_MIX.items()),
+        )
+        parser.add_argument("--users", type=int, default=20, help="Seeded users with a logbook each")
+        parser.add_argument("--tracks", type=int, default=50, help="Tracks per user")
+        parser.add_argument("--photos", type=int, default=3, help="Located photos per track")
+        parser.add_argument("--gpx-points", type=int, default=5000, help="Track points of the uploaded GPX files")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the operation sequence")
+        parser.add_argument("--output", help="Also write the report as JSON to this file")
+
+    def handle(self, *args, **options):
+        database_name = connection.settings_dict["NAME"]
+        with tempfile.TemporaryDirectory(prefix="loadtest-") as var_root, override_settings(
+            MEDIA_ROOT=os.path.join(var_root, "media"), ALLOWED_HOSTS=[*s.ALLOWED_HOSTS, "localhost"]
+        ):
+            if connection.vendor == "sqlite":
+                # a file instead of the in-memory test database, thumbnail workers and --processes open it too
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(var_root, "loadtest.sqlite3")
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+            try:
+                self.stderr.write("Seeding")
+                dataset = load.seed(
+                    options["users"], options["tracks"], options["photos"], gpx_points=options["gpx_points"]
+                )
+                self.stderr.write(f"Replaying for {options['duration']:g} s")
+                samples, elapsed = load.run(
+                    dataset,
+                    options["mix"],
+                    options["duration"],
+                    options["threads"],
+                    options["processes"],
+                    options["seed"],
+                )
+            finally:
+                # renders scheduled by the replayed requests still read the test media and database
+                shutdown_executor()
+                connection.creation.destroy_test_db(database_name, verbosity=0)
+
+        report = load.summarize(samples, elapsed)
+        self.stdout.write(
+            f"{'operation':<16}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        )
+        for operation, row in report.items():
+            self.stdout.write(
+                f"{operation:<16}{row['requests']:>10}{row['errors']:>8}{row['requests_per_second']:>10.1f}"
+                f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+            )
+        if options["output"]:
+            arguments = {name: options[name] for name in ("duration", "threads", "processes", "mix", "seed")}
+            with open(options["output"], "w") as output_file:
+                json.dump({"options": arguments, "report": report}, output_file, indent=2)
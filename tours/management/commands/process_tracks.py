@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tours.processing import process_next_job
+
+
+class Command(BaseCommand):
+    help = "Runs queued track processing jobs (geojson, photo locations, thumbnails)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit as soon as the queue is empty")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds to wait when the queue is empty")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            if process_next_job():
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["sleep"])
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from tours.tiles import prune_tiles
+
+
+class Command(BaseCommand):
+    help = "Deletes abandoned and expired vector tiles from the tile cache, run it periodically"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Deleted tiles: {prune_tiles()}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tours.track_stats import rebuild_track_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per user, per tour and monthly track statistics from the tracks, for backfills"
+
+    def handle(self, *args, **options):
+        for model, count in rebuild_track_stats().items():
+            self.stdout.write(f"{model.__name__}: {count}")
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.5 on 2026-10-17 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0005_auto_20210109_1433"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tour",
+            index=models.Index(fields=["owner", "-id"], name="tours_tour_owner_i_99614e_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="track",
+            index=models.Index(fields=["start_date", "id"], name="tours_track_start_d_cdb1d9_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="track",
+            index=models.Index(fields=["owner", "start_date", "id"], name="tours_track_owner_i_c7f61f_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="track",
+            index=models.Index(fields=["owner", "-id"], name="tours_track_owner_i_f2a327_idx"),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.1.5 on 2026-10-17 06:15
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0006_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="track",
+            name="processing_status",
+            field=models.CharField(
+                choices=[("pending", "Pending"), ("done", "Done"), ("failed", "Failed")], default="done", max_length=10
+            ),
+        ),
+        migrations.CreateModel(
+            name="TrackProcessingJob",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="modified"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("queued", "Queued"), ("running", "Running"), ("done", "Done"), ("failed", "Failed")],
+                        db_index=True,
+                        default="queued",
+                        max_length=10,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("track", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="tours.track")),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+    ]
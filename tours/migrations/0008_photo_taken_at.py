@@ -0,0 +1,18 @@
+# Generated by Django 3.1.5 on 2026-10-17 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0007_track_processing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trackphoto",
+            name="taken_at",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.5 on 2026-10-17 06:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import tours.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0008_photo_taken_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrackGeometry",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("tolerance", models.FloatField()),
+                ("vertex_count", models.PositiveIntegerField()),
+                ("file", models.FileField(upload_to=tours.models.upload_to)),
+                ("track", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="tours.track")),
+            ],
+            options={
+                "ordering": ["track", "tolerance"],
+            },
+        ),
+    ]
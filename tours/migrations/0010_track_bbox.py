@@ -0,0 +1,60 @@
+# Generated by Django 3.1.5 on 2026-10-17 06:21
+
+from django.contrib.gis.geos import GEOSException, GEOSGeometry
+from django.db import migrations, models
+
+
+def backfill_geometry(apps, schema_editor):
+    Track = apps.get_model("tours", "Track")
+    for track in Track.objects.exclude(geojson="").exclude(geojson=None).filter(geometry=None).iterator():
+        try:
+            with track.geojson.open("rb") as f:
+                line_string = GEOSGeometry(f.read().decode())
+        except (OSError, ValueError, GEOSException):
+            continue
+        track.geometry = bytes(line_string.wkb)
+        track.min_longitude, track.min_latitude, track.max_longitude, track.max_latitude = line_string.extent
+        track.save(update_fields=["geometry", "min_longitude", "min_latitude", "max_longitude", "max_latitude"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0009_track_geometry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="track",
+            name="geometry",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="track",
+            name="max_latitude",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="track",
+            name="max_longitude",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="track",
+            name="min_latitude",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="track",
+            name="min_longitude",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="track",
+            index=models.Index(
+                fields=["min_longitude", "max_longitude", "min_latitude", "max_latitude"],
+                name="tours_track_min_lon_c48ab7_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_geometry, migrations.RunPython.noop),
+    ]
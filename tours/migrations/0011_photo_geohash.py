@@ -0,0 +1,33 @@
+# Generated by Django 3.1.5 on 2026-10-17 06:23
+
+from django.db import migrations, models
+
+from tours.utils import geohash
+
+
+def backfill_geohash(apps, schema_editor):
+    TrackPhoto = apps.get_model("tours", "TrackPhoto")
+    photos = TrackPhoto.objects.exclude(latitude=None).exclude(longitude=None).filter(geohash=None)
+    for photo in photos.iterator():
+        photo.geohash = geohash.encode(float(photo.latitude), float(photo.longitude))
+        photo.save(update_fields=["geohash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0010_track_bbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trackphoto",
+            name="geohash",
+            field=models.CharField(editable=False, max_length=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="trackphoto",
+            index=models.Index(fields=["geohash", "id"], name="tours_track_geohash_c568a4_idx"),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
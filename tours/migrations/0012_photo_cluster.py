@@ -0,0 +1,64 @@
+# Generated by Django 3.1.5 on 2026-10-17 06:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Substr
+
+MAX_PRECISION = 9
+
+
+def build_photo_clusters(apps, schema_editor):
+    TrackPhoto = apps.get_model("tours", "TrackPhoto")
+    PhotoCluster = apps.get_model("tours", "PhotoCluster")
+    for precision in range(1, MAX_PRECISION + 1):
+        rows = (
+            TrackPhoto.objects.exclude(geohash=None)
+            .annotate(owner_id=F("track__owner_id"), cell=Substr("geohash", 1, precision))
+            .values("owner_id", "cell")
+            .annotate(total=Count("id"), latitudes=Sum("latitude"), longitudes=Sum("longitude"))
+        )
+        PhotoCluster.objects.bulk_create(
+            PhotoCluster(
+                owner_id=row["owner_id"],
+                precision=precision,
+                cell=row["cell"],
+                count=row["total"],
+                latitude_sum=float(row["latitudes"]),
+                longitude_sum=float(row["longitudes"]),
+            )
+            for row in rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("tours", "0011_photo_geohash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PhotoCluster",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("precision", models.PositiveSmallIntegerField()),
+                ("cell", models.CharField(max_length=9)),
+                ("count", models.IntegerField(default=0)),
+                ("latitude_sum", models.FloatField(default=0)),
+                ("longitude_sum", models.FloatField(default=0)),
+                ("owner", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="photocluster",
+            index=models.Index(fields=["precision", "cell"], name="tours_photo_precisi_5164dc_idx"),
+        ),
+        migrations.AlterUniqueTogether(
+            name="photocluster",
+            unique_together={("owner", "precision", "cell")},
+        ),
+        migrations.RunPython(build_photo_clusters, migrations.RunPython.noop),
+    ]
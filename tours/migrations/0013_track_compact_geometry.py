@@ -0,0 +1,20 @@
+# Generated by Django 3.1.5 on 2026-10-17 06:27
+
+from django.db import migrations, models
+
+import tours.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0012_photo_cluster"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="track",
+            name="compact_geometry",
+            field=models.FileField(null=True, upload_to=tours.models.upload_to),
+        ),
+    ]
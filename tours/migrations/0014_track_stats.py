@@ -0,0 +1,99 @@
+# Generated by Django 3.1.14 on 2026-10-17 06:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+TOTAL_FIELDS = ["distance_km", "uphill_m", "downhill_m", "moving_time_s", "stopped_time_s"]
+
+
+def build_track_stats(apps, schema_editor):
+    Track = apps.get_model("tours", "Track")
+    tracks = Track.objects.order_by()
+    sums = {"total": Count("id"), **{f"{name}_sum": Sum(name) for name in TOTAL_FIELDS}}
+    rollups = [
+        ("UserTrackStats", ["owner_id"], tracks),
+        ("TourTrackStats", ["tour_id"], tracks.exclude(tour=None)),
+        (
+            "MonthlyTrackStats",
+            ["owner_id", "year", "month"],
+            tracks.annotate(year=ExtractYear("start_date"), month=ExtractMonth("start_date")),
+        ),
+    ]
+    for model_name, keys, queryset in rollups:
+        model = apps.get_model("tours", model_name)
+        model.objects.bulk_create(
+            model(
+                **{key: row[key] for key in keys},
+                track_count=row["total"],
+                **{name: row[f"{name}_sum"] or 0 for name in TOTAL_FIELDS},
+            )
+            for row in queryset.values(*keys).annotate(**sums)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("tours", "0013_track_compact_geometry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserTrackStats",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("track_count", models.IntegerField(default=0)),
+                ("distance_km", models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ("uphill_m", models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ("downhill_m", models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ("moving_time_s", models.BigIntegerField(default=0)),
+                ("stopped_time_s", models.BigIntegerField(default=0)),
+                (
+                    "owner",
+                    models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="TourTrackStats",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("track_count", models.IntegerField(default=0)),
+                ("distance_km", models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ("uphill_m", models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ("downhill_m", models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ("moving_time_s", models.BigIntegerField(default=0)),
+                ("stopped_time_s", models.BigIntegerField(default=0)),
+                ("tour", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to="tours.tour")),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="MonthlyTrackStats",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("track_count", models.IntegerField(default=0)),
+                ("distance_km", models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ("uphill_m", models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ("downhill_m", models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ("moving_time_s", models.BigIntegerField(default=0)),
+                ("stopped_time_s", models.BigIntegerField(default=0)),
+                ("year", models.PositiveSmallIntegerField()),
+                ("month", models.PositiveSmallIntegerField()),
+                ("owner", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "unique_together": {("owner", "year", "month")},
+            },
+        ),
+        migrations.RunPython(build_track_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.14 on 2026-10-17 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tours", "0014_track_stats"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="photocluster",
+            name="tours_photo_precisi_5164dc_idx",
+        ),
+        migrations.AddIndex(
+            model_name="photocluster",
+            index=models.Index(
+                fields=["precision", "cell"],
+                name="tours_photocluster_cell_like",
+                opclasses=["int2_ops", "varchar_pattern_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="trackphoto",
+            index=models.Index(
+                fields=["geohash"], name="tours_trackphoto_geohash_like", opclasses=["varchar_pattern_ops"]
+            ),
+        ),
+    ]
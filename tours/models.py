@@ -5,12 +5,14 @@ from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from easy_thumbnails.files import get_thumbnailer
-from exif import Image
 from model_utils.models import TimeStampedModel
 from polymorphic.models import PolymorphicModel
 
-from .utils.geo import degrees_minutes_seconds_to_decimal
+from utils.thumbnails import get_thumbnail_url
+
+from .assets import get_asset_url
+from .utils import geohash
+from .utils.exif import read_exif
 
 
 def upload_to(instance, filename):
@@ -30,13 +32,14 @@ class Tour(PolymorphicModel, TimeStampedModel):
 
     class Meta:
         ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["owner", "-id"]),
+        ]
 
     def get_cover_image_preview_url(self, request):
         if not self.cover_image.name:
             return None
-        thumbnailer = get_thumbnailer(self.cover_image)
-        image_url_path = thumbnailer["preview"].url
-        return request.build_absolute_uri(image_url_path)
+        return get_thumbnail_url(self.cover_image, "preview", request)
 
 
 class CyclingTour(Tour):
@@ -54,12 +57,22 @@ class CyclingTour(Tour):
 
 
 class Track(PolymorphicModel, TimeStampedModel):
+    PROCESSING_PENDING = "pending"
+    PROCESSING_DONE = "done"
+    PROCESSING_FAILED = "failed"
+    PROCESSING_CHOICES = [
+        (PROCESSING_PENDING, _("Pending")),
+        (PROCESSING_DONE, _("Done")),
+        (PROCESSING_FAILED, _("Failed")),
+    ]
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, blank=False, null=False)
     name = models.CharField(max_length=1024, blank=False, null=False)
     description = models.TextField(max_length=102400, blank=False, null=True)
     tour = models.ForeignKey(Tour, blank=False, null=True, on_delete=models.PROTECT,)
     gpx_file = models.FileField(upload_to=upload_to, blank=False, null=True)
     geojson = models.FileField(upload_to=upload_to, blank=False, null=True)
+    # the geojson line in the compact format of tours.utils.trackbin, with elevations and times
+    compact_geometry = models.FileField(upload_to=upload_to, blank=False, null=True)
     start_date = models.DateField(blank=False, null=False)
     end_date = models.DateField(blank=False, null=False)
     moving_time_s = models.IntegerField(blank=False, null=True)
@@ -69,13 +82,82 @@ class Track(PolymorphicModel, TimeStampedModel):
     downhill_m = models.DecimalField(max_digits=10, decimal_places=1, blank=False, null=True)
     max_speed_km_per_h = models.DecimalField(max_digits=10, decimal_places=2, blank=False, null=True)
     avg_speed_km_per_h = models.DecimalField(max_digits=10, decimal_places=2, blank=False, null=True)
+    processing_status = models.CharField(
+        max_length=10, choices=PROCESSING_CHOICES, default=PROCESSING_DONE, blank=False, null=False
+    )
+    # simplified line as WKB and its bounding box, for map view queries without reading the geojson file
+    geometry = models.BinaryField(blank=False, null=True, editable=False)
+    min_longitude = models.FloatField(blank=False, null=True, editable=False)
+    min_latitude = models.FloatField(blank=False, null=True, editable=False)
+    max_longitude = models.FloatField(blank=False, null=True, editable=False)
+    max_latitude = models.FloatField(blank=False, null=True, editable=False)
 
     class Meta:
         ordering = ["start_date"]
+        indexes = [
+            models.Index(fields=["start_date", "id"]),
+            models.Index(fields=["owner", "start_date", "id"]),
+            models.Index(fields=["owner", "-id"]),
+            models.Index(fields=["min_longitude", "max_longitude", "min_latitude", "max_latitude"]),
+        ]
 
     def get_geojson_url(self, request):
-        if self.geojson.name:
-            return request.build_absolute_uri(self.geojson.url)
+        return get_asset_url(self.geojson, request)
+
+    def get_compact_geometry_url(self, request):
+        return get_asset_url(self.compact_geometry, request)
+
+    def set_geometry(self, line_string):
+        self.geometry = bytes(line_string.wkb)
+        self.min_longitude, self.min_latitude, self.max_longitude, self.max_latitude = line_string.extent
+
+    @staticmethod
+    def in_bbox(min_longitude, min_latitude, max_longitude, max_latitude):
+        """Filter for tracks whose bounding box intersects the given one, answered by the bbox index."""
+        return models.Q(
+            min_longitude__lte=max_longitude,
+            max_longitude__gte=min_longitude,
+            min_latitude__lte=max_latitude,
+            max_latitude__gte=min_latitude,
+        )
+
+
+class TrackGeometry(models.Model):
+    """GeoJSON line of a track simplified with ``tolerance`` degrees, one per level of detail."""
+
+    track = models.ForeignKey(Track, blank=False, null=False, on_delete=models.CASCADE)
+    tolerance = models.FloatField(blank=False, null=False)
+    vertex_count = models.PositiveIntegerField(blank=False, null=False)
+    file = models.FileField(upload_to=upload_to, blank=False, null=False)
+
+    class Meta:
+        ordering = ["track", "tolerance"]
+
+    def get_url(self, request):
+        return get_asset_url(self.file, request)
+
+    @staticmethod
+    def select(geometries, zoom=None, max_vertices=None):
+        """
+        Pick from the ``geometries`` of a track (ordered from fine to coarse) the coarsest one
+        whose tolerance is below a pixel at web map ``zoom`` and the finest one with at most
+        ``max_vertices``. With both, the coarser of the two is returned.
+        """
+        if not geometries:
+            return None
+        selected = 0
+        if zoom is not None:
+            pixel_degrees = 360 / (256 * 2 ** zoom)
+            for index, geometry in enumerate(geometries):
+                if geometry.tolerance <= pixel_degrees:
+                    selected = index
+        if max_vertices is not None:
+            index = next(
+                (index for index, geometry in enumerate(geometries) if geometry.vertex_count <= max_vertices),
+                len(geometries) - 1,
+            )
+            selected = max(selected, index)
+        return geometries[selected]
 
 
 class TrackPhoto(models.Model):
@@ -83,27 +165,193 @@ class TrackPhoto(models.Model):
     file = models.ImageField(upload_to=upload_to, blank=False, null=False)
     longitude = models.DecimalField(max_digits=8, decimal_places=5, blank=False, null=True)
     latitude = models.DecimalField(max_digits=8, decimal_places=5, blank=False, null=True)
+    taken_at = models.DateTimeField(blank=False, null=True)
+    # geohash of the location, points close to each other share a prefix
+    geohash = models.CharField(max_length=geohash.PRECISION, blank=False, null=True, editable=False)
+
+    # photos compared by distance at most, see nearest
+    NEAREST_MAX_CANDIDATES = 10000
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["geohash", "id"]),
+            # prefix (LIKE 'cell%') lookups independent of the database collation
+            models.Index(fields=["geohash"], name="tours_trackphoto_geohash_like", opclasses=["varchar_pattern_ops"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geohash.encode(float(self.latitude), float(self.longitude))
+        else:
+            self.geohash = None
+        super().save(*args, **kwargs)
 
     def get_url(self, request):
         return request.build_absolute_uri(self.file.url)
 
     def get_preview_url(self, request):
-        thumbnailer = get_thumbnailer(self.file)
-        image_url_path = thumbnailer["preview"].url
-        return request.build_absolute_uri(image_url_path)
+        return get_thumbnail_url(self.file, "preview", request)
 
     def get_icon_url(self, request):
-        thumbnailer = get_thumbnailer(self.file)
-        image_url_path = thumbnailer["icon"].url
-        return request.build_absolute_uri(image_url_path)
+        return get_thumbnail_url(self.file, "icon", request)
 
-    def save(self, *args, **kwargs):
-        # save lat / long
-        exif_data = Image(self.file.read())
-        if hasattr(exif_data, "gps_longitude") and hasattr(exif_data, "gps_latitude"):
-            self.longitude = degrees_minutes_seconds_to_decimal(*exif_data.gps_longitude)
-            self.latitude = degrees_minutes_seconds_to_decimal(*exif_data.gps_latitude)
-        super().save(*args, **kwargs)
+    def update_from_exif(self):
+        exif_data = read_exif(self.file)
+        if exif_data.longitude is not None and exif_data.latitude is not None:
+            self.longitude = exif_data.longitude
+            self.latitude = exif_data.latitude
+        if exif_data.taken_at:
+            taken_at = exif_data.taken_at
+            self.taken_at = taken_at if timezone.is_aware(taken_at) else timezone.make_aware(taken_at)
+
+    @staticmethod
+    def _in_cells(cells):
+        query = models.Q()
+        for cell in cells:
+            query |= models.Q(geohash__startswith=cell)
+        return query
+
+    @staticmethod
+    def in_bbox(min_longitude, min_latitude, max_longitude, max_latitude):
+        """
+        Filter for photos inside the given box. The geohash cells covering the box are answered by
+        the geohash index, the exact coordinates only have to be checked for the rows in those cells.
+        """
+        cells = geohash.cover(min_latitude, min_longitude, max_latitude, max_longitude)
+        return TrackPhoto._in_cells(cells) & models.Q(
+            longitude__gte=min_longitude,
+            longitude__lte=max_longitude,
+            latitude__gte=min_latitude,
+            latitude__lte=max_latitude,
+        )
+
+    @staticmethod
+    def nearest(longitude, latitude, count):
+        """
+        The ``count`` photos closest to a point. Starts with the ~150 m geohash cell of the point and its
+        neighbors and widens to larger cells until ``count`` photos are found that no photo outside of
+        the searched cells could be closer than. At most ``NEAREST_MAX_CANDIDATES`` photos are compared,
+        in denser areas the result is the closest of those.
+        """
+        if count <= 0:
+            return []
+        photos = TrackPhoto.objects.exclude(geohash=None).values_list("id", "latitude", "longitude")
+        limit = TrackPhoto.NEAREST_MAX_CANDIDATES
+        distances = {}
+
+        def by_distance(queryset):
+            # the cells of each precision contain the cells searched before, which are kept when it is cut off
+            rows = list(queryset[: limit + 1])
+            distances.update(
+                (photo_id, geohash.distance(latitude, longitude, float(photo_latitude), float(photo_longitude)))
+                for photo_id, photo_latitude, photo_longitude in rows[:limit]
+            )
+            return sorted((distance, photo_id) for photo_id, distance in distances.items()), len(rows) > limit
+
+        for precision in range(7, 0, -1):
+            cells = geohash.neighborhood(latitude, longitude, precision)
+            candidates, truncated = by_distance(photos.filter(TrackPhoto._in_cells(cells)))
+            if truncated:
+                break
+            if len(candidates) >= count and candidates[count - 1][0] <= geohash.min_cell_extent(latitude, precision):
+                break
+        else:
+            candidates, _ = by_distance(photos)
+        ids = [photo_id for _, photo_id in candidates[:count]]
+        photos = TrackPhoto.objects.in_bulk(ids)
+        return [photos[photo_id] for photo_id in ids]
+
+
+class TrackProcessingJob(TimeStampedModel):
+    """
+    Queued post-processing of a created track (geojson and photo locations),
+    run out of band by the ``process_tracks`` management command.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, _("Queued")),
+        (STATUS_RUNNING, _("Running")),
+        (STATUS_DONE, _("Done")),
+        (STATUS_FAILED, _("Failed")),
+    ]
+    track = models.ForeignKey(Track, blank=False, null=False, on_delete=models.CASCADE)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, blank=False, null=False, db_index=True
+    )
+    attempts = models.IntegerField(default=0, blank=False, null=False)
+    error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["id"]
+
+
+class PhotoCluster(models.Model):
+    """
+    Number and coordinate sums of the located photos of an owner within one geohash cell. Cells of
+    every precision up to ``MAX_PRECISION`` are kept, so each zoom level reads a ready made grid.
+    Maintained by :mod:`tours.clusters`.
+    """
+
+    MAX_PRECISION = 9
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, blank=False, null=False)
+    precision = models.PositiveSmallIntegerField(blank=False, null=False)
+    cell = models.CharField(max_length=MAX_PRECISION, blank=False, null=False)
+    count = models.IntegerField(default=0, blank=False, null=False)
+    latitude_sum = models.FloatField(default=0, blank=False, null=False)
+    longitude_sum = models.FloatField(default=0, blank=False, null=False)
+
+    class Meta:
+        unique_together = [["owner", "precision", "cell"]]
+        indexes = [
+            # prefix (LIKE 'cell%') lookups independent of the database collation
+            models.Index(
+                fields=["precision", "cell"],
+                name="tours_photocluster_cell_like",
+                opclasses=["int2_ops", "varchar_pattern_ops"],
+            ),
+        ]
+
+
+class TrackTotals(models.Model):
+    """Number of tracks and the sums of their statistics, tracks without statistics count as 0."""
+
+    track_count = models.IntegerField(default=0, blank=False, null=False)
+    distance_km = models.DecimalField(max_digits=14, decimal_places=2, default=0, blank=False, null=False)
+    uphill_m = models.DecimalField(max_digits=14, decimal_places=1, default=0, blank=False, null=False)
+    downhill_m = models.DecimalField(max_digits=14, decimal_places=1, default=0, blank=False, null=False)
+    moving_time_s = models.BigIntegerField(default=0, blank=False, null=False)
+    stopped_time_s = models.BigIntegerField(default=0, blank=False, null=False)
+
+    class Meta:
+        abstract = True
+
+
+class UserTrackStats(TrackTotals):
+    """Totals of all tracks of a user, maintained by :mod:`tours.track_stats`."""
+
+    owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, blank=False, null=False)
+
+
+class TourTrackStats(TrackTotals):
+    """Totals of the tracks of a tour, maintained by :mod:`tours.track_stats`."""
+
+    tour = models.OneToOneField(Tour, on_delete=models.CASCADE, blank=False, null=False)
+
+
+class MonthlyTrackStats(TrackTotals):
+    """Totals of the tracks of a user starting in a month, maintained by :mod:`tours.track_stats`."""
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, blank=False, null=False)
+    year = models.PositiveSmallIntegerField(blank=False, null=False)
+    month = models.PositiveSmallIntegerField(blank=False, null=False)
+
+    class Meta:
+        unique_together = [["owner", "year", "month"]]
 
 
 class CyclingTrack(Track):
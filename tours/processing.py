@@ -0,0 +1,158 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings as s
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .assets import save_asset
+from .models import Track, TrackGeometry, TrackProcessingJob
+from .utils import trackbin
+from .utils.analysis import analyze_gpx, geometry_levels
+from .utils.geo import line_string_from_array
+from .utils.gpx import GPXParseError
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_track_processing(track):
+    """
+    Queue the post-processing of ``track`` and mark it as pending. The job only becomes visible
+    to workers once the current transaction commits. With ``TRACK_PROCESSING_ASYNC`` disabled
+    it runs right after the commit in the current process instead.
+    """
+    Track.objects.filter(pk=track.pk).update(processing_status=Track.PROCESSING_PENDING)
+    track.processing_status = Track.PROCESSING_PENDING
+    job = TrackProcessingJob.objects.create(track=track)
+    if not s.TRACK_PROCESSING_ASYNC:
+        transaction.on_commit(lambda: process_next_job(job.pk))
+    return job
+
+
+def process_track(track):
+    # geojson preview
+    if track.gpx_file.name:
+        with track.gpx_file.open("rb") as gpx_file:
+            analysis = analyze_gpx(gpx_file)
+        if analysis.line is not None:
+            line_string = line_string_from_array(analysis.line)
+            track.geojson = save_asset(track.pk, line_string.geojson.encode(), ".json")
+            compact_geometry = trackbin.encode(analysis.line, analysis.line_elevations, analysis.line_times)
+            track.compact_geometry = save_asset(track.pk, compact_geometry, trackbin.EXTENSION)
+            track.set_geometry(line_string)
+            track.save(
+                update_fields=[
+                    "geojson",
+                    "compact_geometry",
+                    "geometry",
+                    "min_longitude",
+                    "min_latitude",
+                    "max_longitude",
+                    "max_latitude",
+                ]
+            )
+
+            # level of detail geometries, updated in place when a track is processed again so unchanged
+            # files keep their names and are not removed by django-cleanup
+            levels = geometry_levels(analysis.line)
+            for tolerance, level in levels:
+                TrackGeometry.objects.update_or_create(
+                    track=track,
+                    tolerance=tolerance,
+                    defaults={
+                        "vertex_count": len(level),
+                        "file": save_asset(
+                            f"{track.pk}-{tolerance}", line_string_from_array(level).geojson.encode(), ".json"
+                        ),
+                    },
+                )
+            TrackGeometry.objects.filter(track=track).exclude(
+                tolerance__in=[tolerance for tolerance, _ in levels]
+            ).delete()
+
+    # photo locations and capture times, thumbnails are rendered by the thumbnail pool
+    for photo in track.trackphoto_set.all():
+        with photo.file.open("rb"):
+            photo.update_from_exif()
+        photo.save(update_fields=["longitude", "latitude", "geohash", "taken_at"])
+
+
+def _stale_jobs():
+    """Running jobs not updated for ``TRACK_PROCESSING_TIMEOUT`` seconds, their worker died."""
+    return Q(
+        status=TrackProcessingJob.STATUS_RUNNING,
+        modified__lt=timezone.now() - timedelta(seconds=s.TRACK_PROCESSING_TIMEOUT),
+    )
+
+
+def _fail(job_ids):
+    Track.objects.filter(trackprocessingjob__in=job_ids).update(processing_status=Track.PROCESSING_FAILED)
+    TrackProcessingJob.objects.filter(pk__in=job_ids).update(status=TrackProcessingJob.STATUS_FAILED)
+
+
+def claim_next_job(job_id=None):
+    """
+    Mark the oldest queued job (or the one with ``job_id``) as running and return it, ``None`` if there is none.
+    Stale running jobs are claimed again, or failed once they used up their attempts.
+    """
+    with transaction.atomic():
+        exhausted = TrackProcessingJob.objects.select_for_update(skip_locked=True).filter(
+            _stale_jobs(), attempts__gte=s.TRACK_PROCESSING_MAX_ATTEMPTS
+        )
+        _fail(list(exhausted.values_list("pk", flat=True)))
+
+        jobs = TrackProcessingJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=TrackProcessingJob.STATUS_QUEUED) | _stale_jobs()
+        )
+        if job_id is not None:
+            jobs = jobs.filter(pk=job_id)
+        job = jobs.first()
+        if job is None:
+            return None
+        if job.status == TrackProcessingJob.STATUS_RUNNING:
+            logger.warning("Reclaiming stale job %s of track %s", job.pk, job.track_id)
+        job.status = TrackProcessingJob.STATUS_RUNNING
+        job.attempts += 1
+        job.save(update_fields=["status", "attempts", "modified"])
+    return job
+
+
+def run_job(job_id):
+    """
+    Process the track of a claimed job. Failed jobs are queued again for the next worker, except
+    for invalid GPX files, jobs without attempts left and jobs run inline without workers.
+    """
+    job = TrackProcessingJob.objects.select_related("track").get(pk=job_id)
+    track = job.track.get_real_instance()
+    try:
+        process_track(track)
+    except Exception as e:
+        logger.exception("Processing track %s failed", track.pk)
+        job.error = traceback.format_exc()
+        retry = (
+            s.TRACK_PROCESSING_ASYNC
+            and job.attempts < s.TRACK_PROCESSING_MAX_ATTEMPTS
+            and not isinstance(e, GPXParseError)
+        )
+        if retry:
+            job.status = TrackProcessingJob.STATUS_QUEUED
+        else:
+            job.status = TrackProcessingJob.STATUS_FAILED
+            Track.objects.filter(pk=track.pk).update(processing_status=Track.PROCESSING_FAILED)
+    else:
+        job.status = TrackProcessingJob.STATUS_DONE
+        job.error = None
+        Track.objects.filter(pk=track.pk).update(processing_status=Track.PROCESSING_DONE)
+    job.save(update_fields=["status", "error", "modified"])
+    return job
+
+
+def process_next_job(job_id=None):
+    """Run the oldest queued job (or the one with ``job_id``), returns ``False`` if there was none."""
+    job = claim_next_job(job_id)
+    if job is None:
+        return False
+    run_job(job.pk)
+    return True
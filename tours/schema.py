@@ -1,24 +1,42 @@
 import math
-from io import StringIO
 
-import gpxpy
 from django.conf import settings as s
-from django.contrib.gis.geos import LineString, Point
-from django.core.files import File
 from django.db.transaction import atomic
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
-from gpxpy.gpx import GPXXMLSyntaxException
-from graphene import ID, Argument, Date, Field, Float, InputObjectType, Int, List, Mutation, ObjectType, String
+from graphene import (
+    ID,
+    Argument,
+    Date,
+    DateTime,
+    Field,
+    Float,
+    InputObjectType,
+    Int,
+    List,
+    Mutation,
+    ObjectType,
+    String,
+    relay,
+)
 from graphene_django.types import DjangoObjectType
 from graphene_file_upload.scalars import Upload
 from graphql import GraphQLError
 from graphql_jwt.decorators import login_required
 
+from users.loaders import UserLoader
+from users.models import User
 from users.schema import UserPublicType
-from utils.graphene import field_name_to_readable
+from utils.graphene import field_name_to_readable, get_loader
+from utils.pagination import paginate
 
-from .models import CyclingTour, CyclingTrack, TrackPhoto
+from .clusters import get_photo_clusters
+from .loaders import MonthlyTrackStatsLoader, TourTrackStatsLoader, TrackGeometriesLoader, TrackPhotosLoader
+from .models import CyclingTour, CyclingTrack, MonthlyTrackStats, Tour, Track, TrackGeometry, TrackPhoto
+from .processing import enqueue_track_processing
+from .track_stats import TOTAL_FIELDS
+from .utils.analysis import analyze_gpx
+from .utils.gpx import GPXParseError
 
 
 class HoursMinutesType(ObjectType):
@@ -31,12 +49,95 @@ class HoursMinutesArgument(InputObjectType):
     minutes = Int()
 
 
+def hours_minutes(seconds):
+    if seconds:
+        minutes = math.floor(seconds / 60)
+        hours = math.floor(minutes / 60)
+        return HoursMinutesType(hours=hours, minutes=minutes % 60)
+
+
+class TrackStatsType(ObjectType):
+    track_count = Int()
+    distance_km = Float()
+    uphill_m = Float()
+    downhill_m = Float()
+    moving_time = Field(HoursMinutesType)
+    stopped_time = Field(HoursMinutesType)
+
+    @staticmethod
+    def resolve_moving_time(self, info):
+        return hours_minutes(self.moving_time_s)
+
+    @staticmethod
+    def resolve_stopped_time(self, info):
+        return hours_minutes(self.stopped_time_s)
+
+
+class PeriodTrackStatsType(TrackStatsType):
+    year = Int()
+    month = Int()
+
+
+def _years(months):
+    """Totals per year of monthly totals ordered by year, as :class:`MonthlyTrackStats` without a month."""
+    years = []
+    for month in months:
+        if not years or years[-1].year != month.year:
+            years.append(MonthlyTrackStats(owner_id=month.owner_id, year=month.year, month=None))
+        year = years[-1]
+        for name in ["track_count", *TOTAL_FIELDS]:
+            setattr(year, name, getattr(year, name) + getattr(month, name))
+    return years
+
+
+class UserTrackStatsType(TrackStatsType):
+    years = List(PeriodTrackStatsType)
+    months = List(PeriodTrackStatsType, year=Int())
+
+    @staticmethod
+    def resolve_years(self, info):
+        return get_loader(info, MonthlyTrackStatsLoader).load(self.owner_id).then(_years)
+
+    @staticmethod
+    def resolve_months(self, info, year=None):
+        return (
+            get_loader(info, MonthlyTrackStatsLoader)
+            .load(self.owner_id)
+            .then(lambda months: [month for month in months if year is None or month.year == year])
+        )
+
+
 class PhotoType(ObjectType):
     url = String()
     icon_url = String()
     preview_url = String()
     longitude = Float()
     latitude = Float()
+    taken_at = DateTime()
+
+    @staticmethod
+    def resolve_url(self, info):
+        return self.get_url(info.context)
+
+    @staticmethod
+    def resolve_icon_url(self, info):
+        return self.get_icon_url(info.context)
+
+    @staticmethod
+    def resolve_preview_url(self, info):
+        return self.get_preview_url(info.context)
+
+
+class PhotoConnection(relay.Connection):
+    class Meta:
+        node = PhotoType
+
+
+class PhotoClusterType(ObjectType):
+    cell = String()
+    count = Int()
+    longitude = Float()
+    latitude = Float()
 
 
 class TrackTypeMixin:
@@ -54,6 +155,7 @@ class TrackTypeMixin:
     uphill_m = Float()
     downhill_m = Float()
     photos = List(Upload)
+    processing_status = String()
 
 
 class TrackType(TrackTypeMixin, DjangoObjectType):
@@ -69,41 +171,45 @@ class TrackType(TrackTypeMixin, DjangoObjectType):
             "created",
         )
 
-    geojson = String()
+    geojson = String(zoom=Int(), max_vertices=Int())
+    compact_geometry = String()
     photos = List(PhotoType)
 
+    @staticmethod
+    def resolve_owner(self, info):
+        return get_loader(info, UserLoader).load(self.owner_id)
+
     @staticmethod
     def resolve_moving_time(self, info):
-        if self.moving_time_s:
-            minutes = math.floor(self.moving_time_s / 60)
-            hours = math.floor(minutes / 60)
-            return HoursMinutesType(hours=hours, minutes=minutes % 60)
+        return hours_minutes(self.moving_time_s)
 
     @staticmethod
     def resolve_stopped_time(self, info):
-        if self.stopped_time_s:
-            minutes = math.floor(self.stopped_time_s / 60)
-            hours = math.floor(minutes / 60)
-            return HoursMinutesType(hours=hours, minutes=minutes % 60)
+        return hours_minutes(self.stopped_time_s)
+
+    @staticmethod
+    def resolve_geojson(self, info, zoom=None, max_vertices=None):
+        if zoom is None and max_vertices is None:
+            return self.get_geojson_url(info.context)
+
+        def get_url(geometries):
+            geometry = TrackGeometry.select(geometries, zoom, max_vertices)
+            return geometry.get_url(info.context) if geometry else self.get_geojson_url(info.context)
+
+        return get_loader(info, TrackGeometriesLoader).load(self.pk).then(get_url)
 
     @staticmethod
-    def resolve_geojson(self, info):
-        return self.get_geojson_url(info.context)
+    def resolve_compact_geometry(self, info):
+        return self.get_compact_geometry_url(info.context)
 
     @staticmethod
     def resolve_photos(self, info):
-        photos = []
-        for photo in self.trackphoto_set.all():
-            photos.append(
-                PhotoType(
-                    url=photo.get_url(info.context),
-                    preview_url=photo.get_preview_url(info.context),
-                    icon_url=photo.get_icon_url(info.context),
-                    longitude=photo.longitude,
-                    latitude=photo.latitude,
-                )
-            )
-        return photos
+        return get_loader(info, TrackPhotosLoader).load(self.pk)
+
+
+class TrackConnection(relay.Connection):
+    class Meta:
+        node = TrackType
 
 
 class CreateTrack(TrackTypeMixin, Mutation):
@@ -169,27 +275,15 @@ class CreateTrack(TrackTypeMixin, Mutation):
             if photo.size > s.PHOTO_MAX_FILESIZE_BYTES:
                 raise GraphQLError(_("Image file size too large"))
 
-        track = CyclingTrack(owner=info.context.user, **fields)
-
-        # append gpx file
+        # validate gpx file, the cached analysis is reused by the processing job
         gpx_file = fields.get("gpx_file")
         if gpx_file:
             try:
-                gpx = gpxpy.parse(gpx_file.file.read())
-                gpx.smooth(vertical=True, horizontal=False, remove_extremes=False)
-                gpx_file.seek(0)
-            except (GPXXMLSyntaxException, UnicodeDecodeError) as e:
-                print(e)
+                analyze_gpx(gpx_file)
+            except GPXParseError:
                 raise GraphQLError(_("GPX format is unknown."))
 
-            # save geojson preview
-            tolerance = 0.0001
-            line_string = LineString([Point(p.point.longitude, p.point.latitude).coords for p in gpx.get_points_data()])
-            line_string = line_string.simplify(tolerance, True)
-
-            # save gpx file
-            track.geojson.save(f"{track.pk}.json", File(StringIO(line_string.geojson)))
-
+        track = CyclingTrack(owner=info.context.user, **fields)
         track.save()
 
         # add images
@@ -198,6 +292,12 @@ class CreateTrack(TrackTypeMixin, Mutation):
                 track=track, file=photo,
             )
 
+        # geojson, photo locations and thumbnails are done by the processing job
+        if track.gpx_file or photos:
+            enqueue_track_processing(track)
+
+        return CreateTrack(id=track.pk, processing_status=track.processing_status)
+
 
 class GPXFileInfoUpload(TrackTypeMixin, Mutation):
     class Arguments:
@@ -209,63 +309,40 @@ class GPXFileInfoUpload(TrackTypeMixin, Mutation):
         gpx_file = fields["file"]
 
         try:
-            gpx = gpxpy.parse(gpx_file.file.read())
-            gpx.smooth(vertical=True, horizontal=False, remove_extremes=False)
-        except (GPXXMLSyntaxException, UnicodeDecodeError):
+            analysis = analyze_gpx(gpx_file)
+        except GPXParseError:
             raise GraphQLError(_("GPX format is unknown."))
 
-        if len(gpx.tracks) == 0:
+        if analysis.track_count == 0:
             raise GraphQLError(_("No Tracks found in your GPX file."))
 
-        uphill, downhill = gpx.get_uphill_downhill()
-
-        # construct name from track / gpx metadata
-        name = ""
-        if gpx.name:
-            name = gpx.name
-        if gpx.description:
-            name += f" {gpx.description}"
-        if gpx.tracks[0].name and gpx.tracks[0].name not in name:
-            name += gpx.tracks[0].name
-        if gpx.tracks[0].description and gpx.tracks[0].description not in name:
-            name += f" {gpx.tracks[0].description}"
-        if not name:
-            name = None
-
+        statistics = analysis.statistics
         gpx_info = {
-            "name": name,
-            "distance_km": round((gpx.length_2d() or 0) / 1000, 2) or None,
-            "uphill_m": round(uphill or 0, 2) or None,
-            "downhill_m": round(downhill or 0, 2) or None,
+            "name": analysis.name,
+            "distance_km": round(statistics.distance_m / 1000, 2) or None,
+            "uphill_m": round(statistics.uphill_m, 2) or None,
+            "downhill_m": round(statistics.downhill_m, 2) or None,
         }
 
         # start end time
-        start_time, end_time = gpx.get_time_bounds()
-        if start_time:
-            gpx_info["start_date"] = start_time.date()
-        if end_time:
-            gpx_info["end_date"] = end_time.date()
-
-        moving_data = gpx.get_moving_data(speed_extreemes_percentiles=0.015)
-        if moving_data:
-            # moving time
-            moving_time_minutes = math.floor(moving_data.moving_time / 60)
-            moving_time_hours = math.floor(moving_time_minutes / 60)
-            gpx_info["moving_time"] = HoursMinutesType(hours=moving_time_hours, minutes=moving_time_minutes % 60)
-
-            # stopped time
-            stopped_time_minutes = math.floor(moving_data.stopped_time / 60)
-            stopped_time_hours = math.floor(stopped_time_minutes / 60)
-            gpx_info["stopped_time"] = HoursMinutesType(hours=stopped_time_hours, minutes=stopped_time_minutes % 60)
-
-            # max speed
-            gpx_info["max_speed_km_per_h"] = round(moving_data.max_speed * 3600 / 1000, 2) or None
-
-            # avg speed
-            avg_speed = 0
-            if moving_data.moving_time > 0:
-                avg_speed = moving_data.moving_distance / moving_data.moving_time
-            gpx_info["avg_speed_km_per_h"] = round(avg_speed * 3600 / 1000, 2) or None
+        if analysis.start_time:
+            gpx_info["start_date"] = analysis.start_time.date()
+        if analysis.end_time:
+            gpx_info["end_date"] = analysis.end_time.date()
+
+        # moving time
+        moving_time_minutes = math.floor(statistics.moving_time_s / 60)
+        moving_time_hours = math.floor(moving_time_minutes / 60)
+        gpx_info["moving_time"] = HoursMinutesType(hours=moving_time_hours, minutes=moving_time_minutes % 60)
+
+        # stopped time
+        stopped_time_minutes = math.floor(statistics.stopped_time_s / 60)
+        stopped_time_hours = math.floor(stopped_time_minutes / 60)
+        gpx_info["stopped_time"] = HoursMinutesType(hours=stopped_time_hours, minutes=stopped_time_minutes % 60)
+
+        # max / avg speed
+        gpx_info["max_speed_km_per_h"] = round(statistics.max_speed_m_per_s * 3600 / 1000, 2) or None
+        gpx_info["avg_speed_km_per_h"] = round(statistics.avg_speed_m_per_s * 3600 / 1000, 2) or None
 
         return GPXFileInfoUpload(**gpx_info)
 
@@ -285,43 +362,120 @@ class TourType(DjangoObjectType):
 
     owner = Field(UserPublicType)
     tracks = List(TrackType)
+    stats = Field(TrackStatsType)
+
+    @staticmethod
+    def resolve_owner(self, info):
+        return get_loader(info, UserLoader).load(self.owner_id)
+
+    @staticmethod
+    def resolve_stats(self, info):
+        return get_loader(info, TourTrackStatsLoader).load(self.pk)
 
     @staticmethod
     def resolve_track(self, info):
         return self.track_set.all()
 
 
+class TourConnection(relay.Connection):
+    class Meta:
+        node = TourType
+
+
 class Query:
     tour = Field(TourType, id=ID(required=True))
-    tours = List(TourType)
+    tours = Field(TourConnection, first=Int(), after=String())
     track = Field(TrackType, id=ID(required=True))
-    tracks = List(TrackType)
-    my_tours = List(TourType)
-    my_tracks = List(TrackType)
+    tracks = Field(TrackConnection, first=Int(), after=String())
+    my_tours = Field(TourConnection, first=Int(), after=String())
+    my_tracks = Field(TrackConnection, first=Int(), after=String())
+    photos_in_bbox = Field(
+        PhotoConnection,
+        min_lon=Float(required=True),
+        min_lat=Float(required=True),
+        max_lon=Float(required=True),
+        max_lat=Float(required=True),
+        first=Int(),
+        after=String(),
+    )
+    photo_clusters = List(
+        PhotoClusterType,
+        zoom=Int(required=True),
+        min_lon=Float(required=True),
+        min_lat=Float(required=True),
+        max_lon=Float(required=True),
+        max_lat=Float(required=True),
+        user_id=ID(),
+        logbook=String(),
+    )
+    nearest_photos = List(PhotoType, lon=Float(required=True), lat=Float(required=True), first=Int())
+    tracks_in_bbox = Field(
+        TrackConnection,
+        min_lon=Float(required=True),
+        min_lat=Float(required=True),
+        max_lon=Float(required=True),
+        max_lat=Float(required=True),
+        first=Int(),
+        after=String(),
+    )
 
     @staticmethod
     def resolve_tour(self, info, **kwargs):
         return CyclingTour.objects.get(**kwargs)
 
     @staticmethod
-    def resolve_tours(self, info, **kwargs):
-        return CyclingTour.objects.all()
+    def resolve_tours(self, info, first=None, after=None):
+        return paginate(info, Tour.objects.instance_of(CyclingTour), ["-id"], first, after)
 
     @staticmethod
     def resolve_track(self, info, **kwargs):
         return CyclingTrack.objects.get(**kwargs)
 
     @staticmethod
-    def resolve_tracks(self, info, **kwargs):
-        return CyclingTrack.objects.all()
+    def resolve_tracks(self, info, first=None, after=None):
+        return paginate(info, Track.objects.instance_of(CyclingTrack), ["start_date", "id"], first, after)
+
+    @staticmethod
+    def resolve_photos_in_bbox(self, info, min_lon, min_lat, max_lon, max_lat, first=None, after=None):
+        if min_lon > max_lon or min_lat > max_lat:
+            raise GraphQLError(_("Invalid bounding box"))
+        photos = TrackPhoto.objects.filter(TrackPhoto.in_bbox(min_lon, min_lat, max_lon, max_lat))
+        return paginate(info, photos, ["geohash", "id"], first, after)
+
+    @staticmethod
+    def resolve_photo_clusters(self, info, zoom, min_lon, min_lat, max_lon, max_lat, user_id=None, logbook=None):
+        if min_lon > max_lon or min_lat > max_lat:
+            raise GraphQLError(_("Invalid bounding box"))
+        if zoom < 0:
+            raise GraphQLError(_("zoom can not be negative"))
+        owner_id = user_id
+        if logbook:
+            owner_id = get_object_or_404(User, logbook_subdomain=logbook).pk
+        return get_photo_clusters(zoom, min_lon, min_lat, max_lon, max_lat, owner_id)
+
+    @staticmethod
+    def resolve_nearest_photos(self, info, lon, lat, first=None):
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            raise GraphQLError(_("Invalid coordinates"))
+        first = 10 if first is None else first
+        return TrackPhoto.nearest(lon, lat, max(0, min(first, s.PAGINATION_MAX_PAGE_SIZE)))
+
+    @staticmethod
+    def resolve_tracks_in_bbox(self, info, min_lon, min_lat, max_lon, max_lat, first=None, after=None):
+        if min_lon > max_lon or min_lat > max_lat:
+            raise GraphQLError(_("Invalid bounding box"))
+        tracks = Track.objects.instance_of(CyclingTrack).filter(Track.in_bbox(min_lon, min_lat, max_lon, max_lat))
+        return paginate(info, tracks, ["-id"], first, after)
 
     @login_required
-    def resolve_my_tours(self, info):
-        return CyclingTour.objects.filter(owner=info.context.user)
+    def resolve_my_tours(self, info, first=None, after=None):
+        tours = Tour.objects.instance_of(CyclingTour).filter(owner=info.context.user)
+        return paginate(info, tours, ["-id"], first, after)
 
     @login_required
-    def resolve_my_tracks(self, info):
-        return CyclingTrack.objects.filter(owner=info.context.user).order_by("-pk")
+    def resolve_my_tracks(self, info, first=None, after=None):
+        tracks = Track.objects.instance_of(CyclingTrack).filter(owner=info.context.user)
+        return paginate(info, tracks, ["-id"], first, after)
 
 
 class Mutation(ObjectType):
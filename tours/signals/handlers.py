@@ -1,10 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django_cleanup.signals import cleanup_pre_delete
 from easy_thumbnails.files import get_thumbnailer
-from easy_thumbnails.signal_handlers import generate_aliases_global
 from easy_thumbnails.signals import saved_file
 
-# connect easy_thumbnails
-saved_file.connect(generate_aliases_global)
+from utils.response_cache import invalidate_owner
+from utils.thumbnails import schedule_thumbnails
+
+from ..assets import delete_asset_variants
+from ..clusters import update_photo_clusters
+from ..models import CyclingTrack, Tour, Track, TrackGeometry, TrackPhoto
+from ..tiles import invalidate_tiles
+from ..track_stats import TRACKED_FIELDS, previous_contribution, track_contribution, update_track_stats
+
+
+# connect easy_thumbnails, aliases are rendered in the thumbnail pool once the upload is committed
+def generate_aliases(sender, fieldfile, **kwargs):
+    transaction.on_commit(lambda: schedule_thumbnails(fieldfile))
+
+
+saved_file.connect(generate_aliases)
 
 
 # delete easy_thumbnails images on file delete
@@ -14,3 +29,106 @@ def easy_thumbnails_delete(**kwargs):
 
 
 cleanup_pre_delete.connect(easy_thumbnails_delete)
+
+
+# delete the precompressed variants of geometry assets
+def geometry_asset_variants_delete(**kwargs):
+    delete_asset_variants(kwargs["file"].name)
+
+
+cleanup_pre_delete.connect(geometry_asset_variants_delete)
+
+
+def track_owner_id(track_id):
+    return Track.objects.filter(pk=track_id).values_list("owner_id", flat=True).first()
+
+
+# drop the cached vector tiles of a user when one of their tracks or its geometries change
+def track_tiles_invalidate(sender, instance, **kwargs):
+    if isinstance(instance, Track):
+        owner_id = instance.owner_id
+    elif isinstance(instance, TrackGeometry):
+        owner_id = track_owner_id(instance.track_id)
+    else:
+        return
+    if owner_id is not None:
+        transaction.on_commit(lambda: invalidate_tiles(owner_id))
+
+
+for model in [Track, CyclingTrack, TrackGeometry]:
+    post_save.connect(track_tiles_invalidate, sender=model)
+    post_delete.connect(track_tiles_invalidate, sender=model)
+
+
+# drop the cached public GraphQL responses of the owner
+def response_cache_invalidate(sender, instance, **kwargs):
+    if isinstance(instance, (Tour, Track)):
+        owner_id = instance.owner_id
+    elif isinstance(instance, (TrackGeometry, TrackPhoto)):
+        owner_id = track_owner_id(instance.track_id)
+    else:
+        return
+    if owner_id is not None:
+        invalidate_owner(owner_id)
+
+
+post_save.connect(response_cache_invalidate)
+post_delete.connect(response_cache_invalidate)
+
+
+# keep the photo cluster grid in sync with photo locations
+def photo_location(photo):
+    # rounded like the stored decimals, so removing a photo subtracts what adding it added
+    if photo.geohash:
+        return photo.geohash, round(float(photo.latitude), 5), round(float(photo.longitude), 5)
+
+
+def photo_clusters_remember_location(sender, instance, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = TrackPhoto.objects.filter(pk=instance.pk).only("geohash", "latitude", "longitude").first()
+    instance._previous_location = photo_location(previous) if previous else None
+
+
+def photo_clusters_update(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_location", None)
+    current = photo_location(instance)
+    if previous != current:
+        update_photo_clusters(track_owner_id(instance.track_id), previous, current)
+
+
+def photo_clusters_remove(sender, instance, **kwargs):
+    owner_id = track_owner_id(instance.track_id)
+    if owner_id is not None:
+        update_photo_clusters(owner_id, photo_location(instance), None)
+
+
+pre_save.connect(photo_clusters_remember_location, sender=TrackPhoto)
+post_save.connect(photo_clusters_update, sender=TrackPhoto)
+post_delete.connect(photo_clusters_remove, sender=TrackPhoto)
+
+
+# keep the track statistics rollups in sync with the tracks
+def track_stats_remember_contribution(sender, instance, update_fields=None, **kwargs):
+    # saves of other fields, like the processing results, do not change the rollups
+    instance._track_stats_changed = update_fields is None or bool(TRACKED_FIELDS.intersection(update_fields))
+    instance._previous_contribution = None
+    if instance._track_stats_changed and instance.pk:
+        instance._previous_contribution = previous_contribution(instance.pk)
+
+
+def track_stats_update(sender, instance, **kwargs):
+    if getattr(instance, "_track_stats_changed", True):
+        update_track_stats(getattr(instance, "_previous_contribution", None), track_contribution(instance))
+
+
+def track_stats_remove(sender, instance, **kwargs):
+    # deleting a track sends post_delete for the rows of its model and its parent models, count it once
+    if type(instance) is instance.get_real_instance_class():
+        update_track_stats(track_contribution(instance), None)
+
+
+for model in [Track, CyclingTrack]:
+    pre_save.connect(track_stats_remember_contribution, sender=model)
+    post_save.connect(track_stats_update, sender=model)
+    post_delete.connect(track_stats_remove, sender=model)
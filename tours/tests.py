@@ -0,0 +1,423 @@
+import gzip
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import unittest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.conf import settings as s
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql import GraphQLError
+from PIL import Image
+
+from users.models import User
+from utils import metrics
+from utils.pagination import decode_cursor, encode_cursor
+
+from .assets import ASSETS_DIR, brotli, save_asset
+from .clusters import MAX_CLUSTERS, precision_for_box, precision_for_zoom
+from .models import CyclingTrack, MonthlyTrackStats, Track, TrackPhoto, UserTrackStats
+from .tiles import get_tile, invalidate_tiles, prune_tiles, tile_cache_dir, tile_generation
+from .utils import geohash, mvt, trackbin
+from .utils.exif import read_exif
+from .utils.gpx import parse_gpx
+from .utils.stats import track_statistics
+
+try:
+    import gpxpy
+except ImportError:
+    gpxpy = None
+
+TRACKS_PHOTOS = """
+query Tracks($first: Int) {
+  tracks(first: $first) {
+    edges { node { id name photos { url longitude latitude } } }
+  }
+}
+"""
+
+
+@override_settings(GRAPHQL_RESPONSE_CACHE_TIMEOUT=0)
+class TrackPhotosQueryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user("owner@example.com", "password", name="Owner", logbook_subdomain="owner")
+        tracks = [
+            CyclingTrack.objects.create(
+                owner=owner,
+                name=f"Track {index}",
+                start_date=date(2020, 7, index + 1),
+                end_date=date(2020, 7, index + 1),
+            )
+            for index in range(10)
+        ]
+        TrackPhoto.objects.bulk_create(
+            TrackPhoto(track=track, file=f"photos/{track.pk}-{index}.jpg") for track in tracks for index in range(3)
+        )
+
+    def query(self, first):
+        response = self.client.post(
+            "/api/v1/", json.dumps({"query": TRACKS_PHOTOS, "variables": {"first": first}}), "application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        content = response.json()
+        self.assertNotIn("errors", content)
+        return content["data"]["tracks"]["edges"]
+
+    def test_photos_are_batched(self):
+        # tracks, their polymorphic rows and one query for the photos of all tracks
+        with self.assertNumQueries(3):
+            edges = self.query(2)
+        self.assertEqual(len(edges), 2)
+
+        with self.assertNumQueries(3):
+            edges = self.query(10)
+        self.assertEqual(len(edges), 10)
+        self.assertEqual([len(edge["node"]["photos"]) for edge in edges], [3] * 10)
+
+
+def make_gpx(tracks, segments, points, seed=0):
+    """GPX content of ``tracks`` tracks of ``segments`` segments of ``points`` noisy points, with pauses and gaps."""
+    rnd = random.Random(seed)
+    time = datetime(2020, 7, 1, 8)
+    latitude, longitude, elevation = 48.1, 11.5, 500.0
+    lines = ['<?xml version="1.0"?>', '<gpx version="1.1" creator="tests" xmlns="http://www.topografix.com/GPX/1/1">']
+    for _ in range(tracks):
+        lines.append("<trk>")
+        for _ in range(segments):
+            lines.append("<trkseg>")
+            for index in range(points):
+                step = 0 if rnd.random() < 0.05 else rnd.random() * 0.0002
+                latitude += step * math.cos(index / 50)
+                longitude += step * math.sin(index / 50)
+                elevation += rnd.uniform(-2, 2.2)
+                time += timedelta(seconds=rnd.choice([1, 2, 5, 60]))
+                ele = f"<ele>{elevation:.1f}</ele>" if rnd.random() > 0.02 else ""
+                lines.append(
+                    f'<trkpt lat="{latitude:.7f}" lon="{longitude:.7f}">{ele}<time>{time:%Y-%m-%dT%H:%M:%SZ}</time></trkpt>'
+                )
+            lines.append("</trkseg>")
+            time += timedelta(minutes=30)
+        lines.append("</trk>")
+    lines.append("</gpx>")
+    return "\n".join(lines)
+
+
+@unittest.skipIf(gpxpy is None, "gpxpy is a dev package")
+class TrackStatisticsTest(SimpleTestCase):
+    def assertMatchesGPXPy(self, content):
+        statistics = track_statistics(parse_gpx(io.BytesIO(content.encode())).segments)
+
+        # what the mutations computed with gpxpy before tours.utils.stats
+        gpx = gpxpy.parse(content)
+        gpx.smooth(vertical=True, horizontal=False, remove_extremes=False)
+        uphill_m, downhill_m = gpx.get_uphill_downhill()
+        moving_data = gpx.get_moving_data(speed_extreemes_percentiles=0.015)
+        expected = {
+            "distance_m": gpx.length_2d(),
+            "uphill_m": uphill_m,
+            "downhill_m": downhill_m,
+            "moving_time_s": moving_data.moving_time,
+            "stopped_time_s": moving_data.stopped_time,
+            "max_speed_m_per_s": moving_data.max_speed,
+        }
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertAlmostEqual(getattr(statistics, field), value, delta=max(abs(value) * 1e-6, 1e-6))
+
+    def test_single_segment(self):
+        self.assertMatchesGPXPy(make_gpx(tracks=1, segments=1, points=500))
+
+    def test_multiple_segments(self):
+        self.assertMatchesGPXPy(make_gpx(tracks=1, segments=4, points=300, seed=1))
+
+    def test_multiple_tracks(self):
+        self.assertMatchesGPXPy(make_gpx(tracks=3, segments=2, points=200, seed=2))
+
+
+class TrackBinTest(SimpleTestCase):
+    line = np.array([[11.5, 48.1], [11.500123, 48.100456], [-179.999999, -89.999999], [179.999999, 89.999999]])
+
+    def test_coordinates(self):
+        line, elevations, times = trackbin.decode(trackbin.encode(self.line))
+        np.testing.assert_allclose(line, self.line, rtol=0, atol=0.5 / trackbin.COORDINATE_SCALE)
+        self.assertIsNone(elevations)
+        self.assertIsNone(times)
+
+    def test_empty_line(self):
+        line, _, _ = trackbin.decode(trackbin.encode(np.empty((0, 2))))
+        self.assertEqual(line.shape, (0, 2))
+
+    def test_elevations_with_gaps(self):
+        _, elevations, _ = trackbin.decode(trackbin.encode(self.line, elevations=[500.04, np.nan, np.nan, -10.5]))
+        # missing elevations are interpolated between their neighbors
+        np.testing.assert_allclose(elevations, [500.0, 329.9, 159.7, -10.5], atol=0.05)
+
+        _, elevations, _ = trackbin.decode(trackbin.encode(self.line, elevations=[np.nan, 100, 101, np.nan]))
+        np.testing.assert_allclose(elevations, [100, 100, 101, 101])
+
+        _, elevations, _ = trackbin.decode(trackbin.encode(self.line, elevations=[np.nan] * 4))
+        self.assertIsNone(elevations)
+
+    def test_times(self):
+        times = [1593590400, 1593590401, 1593594001, 4102444800]
+        _, elevations, decoded = trackbin.decode(trackbin.encode(self.line, times=times))
+        self.assertIsNone(elevations)
+        np.testing.assert_array_equal(decoded, times)
+
+    def test_invalid_data(self):
+        data = trackbin.encode(self.line, elevations=[1, 2, 3, 4], times=[1, 2, 3, 4])
+        for invalid in [b"", b"GPX", data[:3] + b"\x02" + data[4:], data[:-1], data[:-2] + b"\x80"]:
+            with self.subTest(invalid=invalid[:6]), self.assertRaises(trackbin.TrackBinError):
+                trackbin.decode(invalid)
+
+
+class PhotoClusterPrecisionTest(SimpleTestCase):
+    def test_map_sized_box(self):
+        self.assertEqual(precision_for_box(14, 11.5, 48.1, 11.6, 48.15), precision_for_zoom(14))
+
+    def test_box_larger_than_map(self):
+        for zoom in [5, 10, 18]:
+            with self.subTest(zoom=zoom):
+                precision = precision_for_box(zoom, -180, -90, 180, 90)
+                self.assertLess(precision, precision_for_zoom(zoom))
+                rows, columns = geohash.grid_size(-90, -180, 90, 180, precision)
+                self.assertLessEqual(rows * columns, MAX_CLUSTERS)
+
+
+class NearestPhotosTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user("owner@example.com", "password", name="Owner", logbook_subdomain="owner")
+        track = CyclingTrack.objects.create(
+            owner=owner, name="Track", start_date=date(2020, 7, 1), end_date=date(2020, 7, 1)
+        )
+        cls.photos = [
+            TrackPhoto.objects.create(track=track, file=f"photos/{index}.jpg", latitude=48.1 + offset, longitude=11.5)
+            for index, offset in enumerate([0.0001, 0.001, 0.01, 0.1, 1, 10])
+        ]
+
+    def test_nearest(self):
+        self.assertEqual(TrackPhoto.nearest(11.5, 48.1, 3), self.photos[:3])
+        self.assertEqual(TrackPhoto.nearest(11.5, 48.1, 10), self.photos)
+
+    def test_query_with_null_first(self):
+        query = "query Nearest($first: Int) { nearestPhotos(lon: 11.5, lat: 48.1, first: $first) { url } }"
+        response = self.client.post(
+            "/api/v1/", json.dumps({"query": query, "variables": {"first": None}}), "application/json"
+        )
+        content = response.json()
+        self.assertNotIn("errors", content)
+        self.assertEqual(len(content["data"]["nearestPhotos"]), len(self.photos))
+
+    def test_candidates_are_bounded(self):
+        with mock.patch.object(TrackPhoto, "NEAREST_MAX_CANDIDATES", 2), CaptureQueriesContext(connection) as queries:
+            nearest = TrackPhoto.nearest(11.5, 48.1, 3)
+        # the search stops at the first cells with too many photos, keeping those of the smaller cells
+        self.assertEqual(nearest, self.photos[:2])
+        self.assertTrue(all(query["sql"].endswith("LIMIT 3") for query in queries.captured_queries[:-1]))
+
+
+class CursorTest(SimpleTestCase):
+    ordering = ["start_date", "id"]
+
+    def test_values_are_converted(self):
+        cursor = encode_cursor([date(2020, 7, 1), 5])
+        self.assertEqual(decode_cursor(cursor, Track, self.ordering), [date(2020, 7, 1), 5])
+
+    def test_invalid_cursors(self):
+        cursors = [
+            "not base64",
+            encode_cursor({"start_date": "2020-07-01"}),
+            encode_cursor(["2020-07-01"]),
+            encode_cursor(["2020-13-01", 5]),
+            encode_cursor(["2020-07-01", "five"]),
+            encode_cursor([None, 5]),
+            encode_cursor([["2020-07-01"], 5]),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor), self.assertRaisesMessage(GraphQLError, "Invalid cursor"):
+                decode_cursor(cursor, Track, self.ordering)
+
+
+def make_jpeg(latitude, longitude):
+    exif = Image.Exif()
+    exif[0x0132] = "2020:07:01 10:11:12"
+    exif[0x8825] = {1: "N", 2: (latitude, 0.0, 0.0), 3: "W", 4: (longitude, 30.0, 0.0)}
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buffer, "JPEG", exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class ExifTest(SimpleTestCase):
+    def test_location_and_time(self):
+        exif = read_exif(io.BytesIO(make_jpeg(48.0, 11.0)))
+        self.assertAlmostEqual(exif.latitude, 48.0)
+        self.assertAlmostEqual(exif.longitude, -11.5)
+        self.assertEqual(exif.taken_at, datetime(2020, 7, 1, 10, 11, 12))
+
+    def test_truncated_files(self):
+        content = make_jpeg(48.0, 11.0)
+        for data in [
+            b"",
+            b"\xff\xd8",
+            b"\xff\xd8\xff",
+            b"\xff\xd8\xff\xff\xff",
+            b"\xff\xd8\xff\xe1\x00\x01",
+            content[:20],
+        ]:
+            with self.subTest(data=data):
+                self.assertEqual(read_exif(io.BytesIO(data)), (None, None, None))
+
+
+class TileCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(TILES_ROOT=Path(directory.name))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def render(self, empty=False):
+        layer = mvt.Layer("tracks")
+        if not empty:
+            layer.add_line(1, [np.array([[0, 0], [10, 10]])], {"name": "Track"})
+        return mock.patch("tours.tiles.render_layer", return_value=layer)
+
+    def tile_path(self, user_id=1):
+        return tile_cache_dir(user_id).joinpath(tile_generation(user_id), "10", "1", "2.mvt")
+
+    def test_tiles_are_cached(self):
+        with self.render() as render_layer:
+            tile = get_tile(1, 10, 1, 2)
+            self.assertEqual(get_tile(1, 10, 1, 2), tile)
+        render_layer.assert_called_once()
+        self.assertEqual(self.tile_path().read_bytes(), tile)
+
+    def test_empty_tiles_are_not_cached(self):
+        with self.render(empty=True):
+            get_tile(1, 10, 1, 2)
+        self.assertFalse(self.tile_path().exists())
+
+    def test_invalidation_abandons_late_writes(self):
+        with self.render():
+            get_tile(1, 10, 1, 2)
+        abandoned = self.tile_path()
+        invalidate_tiles(1)
+        self.assertFalse(abandoned.exists())
+
+        # a tile rendered before the invalidation and written after it is never served
+        abandoned.parent.mkdir(parents=True)
+        abandoned.write_bytes(b"stale")
+        with self.render():
+            self.assertNotEqual(get_tile(1, 10, 1, 2), b"stale")
+        prune_tiles()
+        self.assertFalse(abandoned.exists())
+
+    def test_expired_tiles(self):
+        with self.render():
+            get_tile(1, 10, 1, 2)
+        expired = time.time() - s.TILES_CACHE_TIMEOUT - 1
+        self.tile_path().write_bytes(b"expired")
+        os.utime(self.tile_path(), (expired, expired))
+        with self.render() as render_layer:
+            self.assertNotEqual(get_tile(1, 10, 1, 2), b"expired")
+        render_layer.assert_called_once()
+
+        os.utime(self.tile_path(), (expired, expired))
+        self.assertEqual(prune_tiles(), 1)
+        self.assertFalse(self.tile_path().exists())
+
+
+class MetricsTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_workers_are_added_up(self):
+        with override_settings(METRICS_DIR=str(self.directory)):
+            metrics.operation_errors.inc(operation="Tracks", type="query")
+            own = metrics.operation_errors.get(operation="Tracks", type="query")
+            # the file of another worker
+            other = {"graphql_operation_errors_total": [[["Tracks", "query"], [2.0]]]}
+            self.directory.joinpath("1-other.json").write_text(json.dumps(other))
+            content = metrics.render()
+        self.assertIn(f'graphql_operation_errors_total{{operation="Tracks",type="query"}} {own + 2:g}', content)
+
+    @override_settings(METRICS_TOKEN="", DEBUG=False)
+    def test_denied_without_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    @override_settings(METRICS_TOKEN="secret", METRICS_DIR="")
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+
+class SaveAssetTest(SimpleTestCase):
+    content = b'{"type": "LineString", "coordinates": []}' * 10
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media_root = Path(directory.name)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def files(self):
+        return sorted(path.name for path in self.media_root.joinpath(ASSETS_DIR).iterdir())
+
+    def test_partial_files_are_replaced(self):
+        name = save_asset(1, self.content, ".json")
+        files = self.files()
+        path = self.media_root.joinpath(name)
+        # a failed attempt left truncated files behind
+        path.write_bytes(self.content[:10])
+        path.with_name(path.name + ".gz").write_bytes(b"\x1f\x8b")
+
+        self.assertEqual(save_asset(1, self.content, ".json"), name)
+        self.assertEqual(self.files(), files)
+        self.assertEqual(path.read_bytes(), self.content)
+        self.assertEqual(gzip.decompress(path.with_name(path.name + ".gz").read_bytes()), self.content)
+
+    def test_concurrent_save(self):
+        save = default_storage.save
+
+        def concurrent_save(name, content):
+            # another job stores the file between the existence check and the save
+            self.media_root.joinpath(name).parent.mkdir(parents=True, exist_ok=True)
+            self.media_root.joinpath(name).write_bytes(content.read())
+            content.seek(0)
+            return save(name, content)
+
+        with mock.patch.object(default_storage, "save", side_effect=concurrent_save):
+            name = save_asset(1, self.content, ".json")
+        expected = [name, f"{name}.gz"] + ([f"{name}.br"] if brotli else [])
+        self.assertEqual(self.files(), sorted(Path(file).name for file in expected))
+
+
+class TrackStatsSignalsTest(TestCase):
+    def test_tracks_are_counted_once(self):
+        owner = User.objects.create_user("owner@example.com", "password", name="Owner", logbook_subdomain="owner")
+        track = CyclingTrack.objects.create(
+            owner=owner, name="Track", start_date=date(2020, 7, 1), end_date=date(2020, 7, 1), distance_km=10
+        )
+        stats = UserTrackStats.objects.get(owner=owner)
+        self.assertEqual((stats.track_count, stats.distance_km), (1, 10))
+
+        track.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.track_count, stats.distance_km), (0, 0))
+        self.assertFalse(MonthlyTrackStats.objects.filter(owner=owner).exists())
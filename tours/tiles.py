@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings as s
+
+from .models import Track, TrackGeometry
+from .utils import mvt
+
+TRACKS_LAYER = "tracks"
+GENERATION_FILE = "generation"
+
+
+def tile_cache_dir(user_id):
+    return s.TILES_ROOT.joinpath(f"user-{user_id}")
+
+
+def _write_file(path, content, replace=True):
+    """
+    Write ``content`` to a temporary file and move it to ``path``, so readers never see a partial file.
+    Without ``replace`` an existing file is kept, returns whether ``path`` was written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporary_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    if replace:
+        os.replace(temporary_path, path)
+        return True
+    try:
+        os.link(temporary_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.unlink(temporary_path)
+
+
+def tile_generation(user_id):
+    """
+    Name of the directory holding the current tiles of a user. Invalidation moves to a new one,
+    so tiles rendered from old tracks and written after it land in an abandoned directory.
+    """
+    path = tile_cache_dir(user_id).joinpath(GENERATION_FILE)
+    try:
+        return path.read_text()
+    except FileNotFoundError:
+        pass
+    # the first request must not overwrite a generation set by a concurrent invalidation
+    _write_file(path, uuid.uuid4().hex.encode(), replace=False)
+    return path.read_text()
+
+
+def remove_abandoned_generations(user_id):
+    """Delete the tile directories of a user that are not the current generation."""
+    generation = tile_generation(user_id)
+    for path in tile_cache_dir(user_id).iterdir():
+        if path.is_dir() and path.name != generation:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def invalidate_tiles(user_id):
+    """Move the tiles of a user to a new generation, they are rendered again on the next request."""
+    _write_file(tile_cache_dir(user_id).joinpath(GENERATION_FILE), uuid.uuid4().hex.encode())
+    remove_abandoned_generations(user_id)
+
+
+def prune_tiles():
+    """Delete abandoned tile generations and expired tiles of all users, returns the number of deleted tiles."""
+    deleted = 0
+    expired = time.time() - s.TILES_CACHE_TIMEOUT
+    if not s.TILES_ROOT.is_dir():
+        return deleted
+    for user_dir in s.TILES_ROOT.glob("user-*"):
+        remove_abandoned_generations(int(user_dir.name[len("user-") :]))
+        for path in user_dir.glob("*/*/*/*.mvt"):
+            try:
+                if path.stat().st_mtime < expired:
+                    path.unlink()
+                    deleted += 1
+            except FileNotFoundError:
+                pass
+    return deleted
+
+
+def _read_line(file):
+    with file.open("rb") as f:
+        coordinates = json.load(f)["coordinates"]
+    return np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+
+
+def render_layer(user_id, z, x, y):
+    """Layer of the tracks of a user in tile ``z/x/y``, each at the level of detail matching ``z``."""
+    tracks = (
+        Track.objects.non_polymorphic()
+        .filter(Track.in_bbox(*mvt.tile_bbox(z, x, y)), owner_id=user_id)
+        .only("id", "name", "start_date", "geojson")
+        .order_by("start_date", "id")
+    )
+    tracks = list(tracks)
+
+    geometries = defaultdict(list)
+    for geometry in TrackGeometry.objects.filter(track__in=tracks).order_by("tolerance"):
+        geometries[geometry.track_id].append(geometry)
+
+    layer = mvt.Layer(TRACKS_LAYER)
+    for track in tracks:
+        geometry = TrackGeometry.select(geometries[track.pk], zoom=z)
+        file = geometry.file if geometry else track.geojson
+        if not file.name:
+            continue
+        parts = mvt.clip_line(mvt.project(_read_line(file), z, x, y))
+        if parts:
+            layer.add_line(track.pk, parts, {"name": track.name, "start_date": track.start_date.isoformat()})
+    return layer
+
+
+def get_tile(user_id, z, x, y):
+    """
+    Cached vector tile ``z/x/y`` of the tracks of a user, rendered on a cache miss or once expired.
+    Tiles without tracks are not cached, they are answered by the bbox index without reading any geometry.
+    """
+    generation = tile_generation(user_id)
+    path = tile_cache_dir(user_id).joinpath(generation, str(z), str(x), f"{y}.mvt")
+    try:
+        if path.stat().st_mtime >= time.time() - s.TILES_CACHE_TIMEOUT:
+            return path.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    layer = render_layer(user_id, z, x, y)
+    tile = mvt.encode_tile([layer])
+    if layer.features:
+        _write_file(path, tile)
+    return tile
@@ -0,0 +1,112 @@
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import MonthlyTrackStats, TourTrackStats, Track, UserTrackStats
+
+TOTAL_FIELDS = ["distance_km", "uphill_m", "downhill_m", "moving_time_s", "stopped_time_s"]
+# track fields deciding which rollups a track is counted in and what it adds to them
+TRACKED_FIELDS = {"owner", "owner_id", "tour", "tour_id", "start_date", *TOTAL_FIELDS}
+
+Contribution = namedtuple("Contribution", ["owner_id", "tour_id", "year", "month", "totals"])
+
+
+def _to_python(name, value):
+    return Track._meta.get_field(name).to_python(value)
+
+
+def track_contribution(track):
+    """What ``track`` adds to the rollups, comparable between the saved and the changed track."""
+    start_date = _to_python("start_date", track.start_date)
+    totals = tuple(_to_python(name, getattr(track, name)) or 0 for name in TOTAL_FIELDS)
+    return Contribution(track.owner_id, track.tour_id, start_date.year, start_date.month, totals)
+
+
+def previous_contribution(track_id):
+    """The contribution of the saved row of ``track_id``, ``None`` if there is none."""
+    track = Track.objects.non_polymorphic().only(*TRACKED_FIELDS - {"owner", "tour"}).filter(pk=track_id).first()
+    return track_contribution(track) if track else None
+
+
+def _rollups(contribution):
+    rollups = [
+        (UserTrackStats, {"owner_id": contribution.owner_id}),
+        (
+            MonthlyTrackStats,
+            {"owner_id": contribution.owner_id, "year": contribution.year, "month": contribution.month},
+        ),
+    ]
+    if contribution.tour_id is not None:
+        rollups.append((TourTrackStats, {"tour_id": contribution.tour_id}))
+    return rollups
+
+
+def _add(contribution, sign):
+    """Add (``sign`` 1) or remove (``sign`` -1) a track's contribution to the rollups it is counted in."""
+    changes = {"track_count": F("track_count") + sign}
+    for name, value in zip(TOTAL_FIELDS, contribution.totals):
+        changes[name] = F(name) + sign * value
+
+    for model, key in _rollups(contribution):
+        rows = model.objects.filter(**key)
+        if rows.update(**changes):
+            if sign < 0 and model is MonthlyTrackStats:
+                rows.filter(track_count__lte=0).delete()
+            continue
+        if sign < 0:
+            # not counted, the rollups have to be rebuilt
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(**key, track_count=1, **dict(zip(TOTAL_FIELDS, contribution.totals)))
+        except IntegrityError:
+            # created by a concurrent request since the update above
+            rows.update(**changes)
+
+
+def update_track_stats(previous, current):
+    """
+    Move a track in the rollups from its ``previous`` to its ``current`` contribution, ``None`` for
+    tracks that are created or deleted.
+    """
+    if previous == current:
+        return
+    if previous:
+        _add(previous, -1)
+    if current:
+        _add(current, 1)
+
+
+@transaction.atomic
+def rebuild_track_stats(batch_size=1000):
+    """Replace all rollups with totals computed from the tracks, returns the number of rows per rollup model."""
+    tracks = Track.objects.non_polymorphic().order_by()
+    sums = {"total": Count("id"), **{f"{name}_sum": Sum(name) for name in TOTAL_FIELDS}}
+    rollups = [
+        (UserTrackStats, ["owner_id"], tracks),
+        (TourTrackStats, ["tour_id"], tracks.exclude(tour=None)),
+        (
+            MonthlyTrackStats,
+            ["owner_id", "year", "month"],
+            tracks.annotate(year=ExtractYear("start_date"), month=ExtractMonth("start_date")),
+        ),
+    ]
+    counts = {}
+    for model, keys, queryset in rollups:
+        model.objects.all().delete()
+        rows = queryset.values(*keys).annotate(**sums)
+        created = model.objects.bulk_create(
+            (
+                model(
+                    **{key: row[key] for key in keys},
+                    track_count=row["total"],
+                    **{name: row[f"{name}_sum"] or 0 for name in TOTAL_FIELDS},
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=batch_size,
+        )
+        counts[model] = len(created)
+    return counts
@@ -0,0 +1,127 @@
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+from django.core.cache import caches
+
+from .geo import line_string_from_array, line_string_to_array
+from .gpx import parse_gpx
+from .stats import track_statistics
+
+# bump when the cached structure or the way it is computed changes
+ANALYSIS_VERSION = 2
+
+# tolerance in degrees of the simplified line stored as the track's geojson
+LINE_TOLERANCE = 0.0001
+
+# tolerances of the level of detail geometries, from the full line down to whole country overviews
+LEVEL_TOLERANCES = (LINE_TOLERANCE, 0.0003, 0.001, 0.003, 0.01, 0.03)
+
+GPXAnalysis = namedtuple(
+    "GPXAnalysis",
+    ["name", "track_count", "start_time", "end_time", "statistics", "line", "line_elevations", "line_times"],
+)
+
+
+def file_sha256(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _track_name(gpx):
+    """Construct a name from track / gpx metadata."""
+    name = ""
+    if gpx.name:
+        name = gpx.name
+    if gpx.description:
+        name += f" {gpx.description}"
+    if gpx.tracks and gpx.tracks[0].name and gpx.tracks[0].name not in name:
+        name += gpx.tracks[0].name
+    if gpx.tracks and gpx.tracks[0].description and gpx.tracks[0].description not in name:
+        name += f" {gpx.tracks[0].description}"
+    return name or None
+
+
+def _vertex_indices(coordinates, line):
+    """Indices in ``coordinates`` of the vertices of ``line``, a simplification keeping a subset of them in order."""
+    keys = coordinates[:, 0] + 1j * coordinates[:, 1]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    line_keys = line[:, 0] + 1j * line[:, 1]
+    starts = np.searchsorted(sorted_keys, line_keys, side="left")
+    ends = np.searchsorted(sorted_keys, line_keys, side="right")
+
+    # a point can be in the track more than once, take its first occurrence after the previous vertex
+    indices = np.empty(len(line), dtype=np.int64)
+    previous = -1
+    for position, (start, end) in enumerate(zip(starts, ends)):
+        candidates = order[start:end]
+        later = candidates[candidates > previous]
+        previous = indices[position] = later[0] if len(later) else candidates[-1]
+    return indices
+
+
+def _analyze(file):
+    gpx = parse_gpx(file)
+    start_time, end_time = gpx.get_time_bounds()
+
+    line = line_elevations = line_times = None
+    coordinates = gpx.get_coordinates()
+    if len(coordinates) > 1:
+        line = line_string_to_array(line_string_from_array(coordinates).simplify(LINE_TOLERANCE, True))
+        indices = _vertex_indices(coordinates, line)
+        line_elevations = np.concatenate([segment.elevations for segment in gpx.segments])[indices]
+        line_times = np.concatenate([segment.times for segment in gpx.segments])[indices]
+
+    return GPXAnalysis(
+        name=_track_name(gpx),
+        track_count=len(gpx.tracks),
+        start_time=start_time,
+        end_time=end_time,
+        statistics=track_statistics(gpx.segments, speed_extremes_percentile=0.015),
+        line=line,
+        line_elevations=line_elevations,
+        line_times=line_times,
+    )
+
+
+def geometry_levels(line):
+    """
+    ``(tolerance, line)`` of every level in :data:`LEVEL_TOLERANCES`, simplified from the analysis' line.
+    Levels that would not drop any further vertex are left out.
+    """
+    levels = []
+    for tolerance in LEVEL_TOLERANCES:
+        if levels:
+            simplified = line_string_to_array(line_string_from_array(line).simplify(tolerance, True))
+            if len(simplified) == len(levels[-1][1]):
+                continue
+        else:
+            simplified = line
+        levels.append((tolerance, simplified))
+    return levels
+
+
+def analyze_gpx(file):
+    """
+    Parse an uploaded GPX file and compute everything the track mutations need from it:
+    metadata, time bounds, statistics and the simplified line as an ``(n, 2)`` longitude, latitude array
+    with the elevations and times (NaN where missing) of its vertices.
+
+    Results are cached under the SHA-256 of the file content in the ``gpx`` cache, so the second
+    upload of the same file (``gpxFileInfo`` followed by ``trackCreate``) is not parsed again.
+    Raises :class:`~tours.utils.gpx.GPXParseError` for invalid files, those are not cached.
+    """
+    cache = caches["gpx"]
+    key = f"gpx-analysis:{ANALYSIS_VERSION}:{file_sha256(file)}"
+
+    analysis = cache.get(key)
+    if analysis is None:
+        analysis = _analyze(file)
+        file.seek(0)
+        cache.set(key, analysis)
+    return analysis
@@ -0,0 +1,161 @@
+import struct
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from .geo import degrees_minutes_seconds_to_decimal
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_APP1 = 0xE1
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+EXIF_HEADER = b"Exif\x00\x00"
+
+TAG_EXIF_IFD = 0x8769
+TAG_GPS_IFD = 0x8825
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_OFFSET_TIME_ORIGINAL = 0x9011
+TAG_GPS_LATITUDE_REF = 0x0001
+TAG_GPS_LATITUDE = 0x0002
+TAG_GPS_LONGITUDE_REF = 0x0003
+TAG_GPS_LONGITUDE = 0x0004
+
+TYPE_ASCII = 2
+TYPE_RATIONAL = 5
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+ExifData = namedtuple("ExifData", ["longitude", "latitude", "taken_at"])
+
+
+def _read_app1(file):
+    """Content of the first Exif APP1 segment, markers are read until the image data starts."""
+    if file.read(2) != JPEG_SOI:
+        return None
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        # fill bytes before a marker
+        while marker[1] == 0xFF:
+            byte = file.read(1)
+            if not byte:
+                return None
+            marker = marker[1:] + byte
+        if marker[1] in (JPEG_SOS, JPEG_EOI):
+            return None
+        length = file.read(2)
+        if len(length) < 2:
+            return None
+        size = struct.unpack(">H", length)[0] - 2
+        if size < 0:
+            return None
+        if marker[1] == JPEG_APP1:
+            segment = file.read(size)
+            if segment.startswith(EXIF_HEADER):
+                return segment[len(EXIF_HEADER) :]
+        else:
+            file.seek(size, 1)
+
+
+class _TIFF:
+    def __init__(self, data):
+        self.data = data
+        if data[:2] == b"II":
+            self.order = "<"
+        elif data[:2] == b"MM":
+            self.order = ">"
+        else:
+            raise ValueError("Invalid TIFF header")
+
+    def unpack(self, fmt, offset):
+        return struct.unpack_from(self.order + fmt, self.data, offset)
+
+    def first_ifd(self):
+        return self.unpack("I", 4)[0]
+
+    def read_ifd(self, offset):
+        """Tags of the IFD at ``offset`` as ``{tag: (type, count, value offset)}``."""
+        entries = {}
+        (count,) = self.unpack("H", offset)
+        for position in range(offset + 2, offset + 2 + count * 12, 12):
+            tag, type_, value_count = self.unpack("HHI", position)
+            size = TYPE_SIZES.get(type_, 1) * value_count
+            value_offset = position + 8 if size <= 4 else self.unpack("I", position + 8)[0]
+            entries[tag] = (type_, value_count, value_offset)
+        return entries
+
+    def pointer(self, entries, tag):
+        if tag in entries:
+            return self.unpack("I", entries[tag][2])[0]
+
+    def ascii(self, entries, tag):
+        if tag not in entries or entries[tag][0] != TYPE_ASCII:
+            return None
+        _, count, offset = entries[tag]
+        return self.data[offset : offset + count].split(b"\x00", 1)[0].decode("ascii", "replace").strip() or None
+
+    def rationals(self, entries, tag):
+        if tag not in entries or entries[tag][0] != TYPE_RATIONAL:
+            return None
+        _, count, offset = entries[tag]
+        values = self.unpack(f"{count * 2}I", offset)
+        return [numerator / denominator if denominator else 0.0 for numerator, denominator in zip(*[iter(values)] * 2)]
+
+
+def _coordinate(tiff, gps, tag, ref_tag, negative_ref):
+    values = tiff.rationals(gps, tag)
+    if not values or len(values) != 3:
+        return None
+    decimal = degrees_minutes_seconds_to_decimal(*values)
+    if (tiff.ascii(gps, ref_tag) or "").upper() == negative_ref:
+        decimal = -decimal
+    return decimal
+
+
+def _taken_at(tiff, exif, ifd0):
+    value = tiff.ascii(exif, TAG_DATETIME_ORIGINAL) or tiff.ascii(ifd0, TAG_DATETIME)
+    if not value:
+        return None
+    try:
+        taken_at = datetime.strptime(value[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
+    # "+02:00" style offset of the camera's local time
+    offset = tiff.ascii(exif, TAG_OFFSET_TIME_ORIGINAL)
+    if offset and len(offset) == 6 and offset[0] in "+-":
+        try:
+            delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+        except ValueError:
+            return taken_at
+        taken_at = taken_at.replace(tzinfo=timezone(-delta if offset[0] == "-" else delta))
+    return taken_at
+
+
+def read_exif(file):
+    """
+    Longitude, latitude (signed by their N/S, E/W references) and capture time of a JPEG file.
+
+    Only the markers in front of the image data are read, so a large photo costs a few kilobytes
+    of I/O instead of a full read. ``taken_at`` is naive unless the camera recorded its UTC offset.
+    Values that are missing or can not be parsed are ``None``.
+    """
+    data = _read_app1(file)
+    if not data:
+        return ExifData(None, None, None)
+
+    try:
+        tiff = _TIFF(data)
+        ifd0 = tiff.read_ifd(tiff.first_ifd())
+        exif_offset = tiff.pointer(ifd0, TAG_EXIF_IFD)
+        exif = tiff.read_ifd(exif_offset) if exif_offset else {}
+        gps_offset = tiff.pointer(ifd0, TAG_GPS_IFD)
+        gps = tiff.read_ifd(gps_offset) if gps_offset else {}
+
+        return ExifData(
+            longitude=_coordinate(tiff, gps, TAG_GPS_LONGITUDE, TAG_GPS_LONGITUDE_REF, "W"),
+            latitude=_coordinate(tiff, gps, TAG_GPS_LATITUDE, TAG_GPS_LATITUDE_REF, "S"),
+            taken_at=_taken_at(tiff, exif, ifd0),
+        )
+    except (struct.error, ValueError):
+        return ExifData(None, None, None)
@@ -1,2 +1,27 @@
+import struct
+
+import numpy as np
+from django.contrib.gis.geos import GEOSGeometry
+
+WKB_LINESTRING = 2
+
+
 def degrees_minutes_seconds_to_decimal(degrees, minutes, seconds):
     return degrees + (minutes / 60) + (seconds / 3600)
+
+
+def line_string_from_array(coordinates):
+    """
+    GEOS ``LineString`` from an ``(n, 2)`` array of longitude, latitude. Goes through WKB,
+    which is much faster than ``LineString(coordinates)`` setting every point on its own.
+    """
+    coordinates = np.ascontiguousarray(coordinates, dtype="<f8")
+    header = struct.pack("<BII", 1, WKB_LINESTRING, len(coordinates))
+    return GEOSGeometry(memoryview(header + coordinates.tobytes()))
+
+
+def line_string_to_array(line_string):
+    """The points of a 2d GEOS ``LineString`` as an ``(n, 2)`` array of longitude, latitude."""
+    wkb = bytes(line_string.wkb)
+    dtype = "<f8" if wkb[0] == 1 else ">f8"
+    return np.frombuffer(wkb, dtype=dtype, offset=9).reshape(-1, 2)
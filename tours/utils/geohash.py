@@ -0,0 +1,122 @@
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 12
+EARTH_RADIUS = 6371008.8
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point, each character splits the cell 32 times alternating longitude and latitude."""
+    latitude_range, longitude_range = [-90.0, 90.0], [-180.0, 180.0]
+    characters = []
+    bits = bit_count = 0
+    even = True
+    while len(characters) < precision:
+        interval, value = (longitude_range, longitude) if even else (latitude_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            characters.append(BASE32[bits])
+            bits = bit_count = 0
+    return "".join(characters)
+
+
+def cell_size(precision):
+    """Height and width in degrees of the cells of a precision."""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def cell_bounds(geohash):
+    """``(min_lat, min_lon, max_lat, max_lon)`` of a cell."""
+    latitude_range, longitude_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for character in geohash:
+        value = BASE32.index(character)
+        for shift in range(4, -1, -1):
+            interval = longitude_range if even else latitude_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return latitude_range[0], longitude_range[0], latitude_range[1], longitude_range[1]
+
+
+def _wrap_longitude(longitude):
+    return (longitude + 180) % 360 - 180
+
+
+def grid_size(min_latitude, min_longitude, max_latitude, max_longitude, precision):
+    """Rows and columns of the cells of a precision that intersect the box."""
+    height, width = cell_size(precision)
+    rows = math.floor((max_latitude + 90) / height) - math.floor((min_latitude + 90) / height) + 1
+    columns = math.floor((max_longitude + 180) / width) - math.floor((min_longitude + 180) / width) + 1
+    return rows, columns
+
+
+def cover(min_latitude, min_longitude, max_latitude, max_longitude, max_cells=16):
+    """
+    Geohash prefixes of the longest precision whose cells cover the box with at most ``max_cells`` cells.
+    Every point in the box has one of the prefixes, the cells may reach outside of it.
+    """
+    for precision in range(PRECISION, 0, -1):
+        rows, columns = grid_size(min_latitude, min_longitude, max_latitude, max_longitude, precision)
+        if rows * columns <= max_cells:
+            break
+    else:
+        return [""]
+    height, width = cell_size(precision)
+
+    # centers of the cells of the box' corner, stepped by a cell size
+    first_latitude = (math.floor((min_latitude + 90) / height) + 0.5) * height - 90
+    first_longitude = (math.floor((min_longitude + 180) / width) + 0.5) * width - 180
+    return sorted(
+        {
+            encode(min(first_latitude + row * height, 90), _wrap_longitude(first_longitude + column * width), precision)
+            for row in range(rows)
+            for column in range(columns)
+        }
+    )
+
+
+def neighborhood(latitude, longitude, precision):
+    """The cell of a point and its eight neighbors."""
+    height, width = cell_size(precision)
+    return sorted(
+        {
+            encode(
+                max(-90.0, min(90.0, latitude + row * height)), _wrap_longitude(longitude + column * width), precision
+            )
+            for row in (-1, 0, 1)
+            for column in (-1, 0, 1)
+        }
+    )
+
+
+def distance(latitude_1, longitude_1, latitude_2, longitude_2):
+    """Haversine distance in meters."""
+    latitude_1, latitude_2 = math.radians(latitude_1), math.radians(latitude_2)
+    a = (
+        math.sin((latitude_2 - latitude_1) / 2) ** 2
+        + math.cos(latitude_1) * math.cos(latitude_2) * math.sin(math.radians(longitude_2 - longitude_1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+def min_cell_extent(latitude, precision):
+    """Smallest height or width in meters of a cell around ``latitude``, a lower bound for the reach of its neighbors."""
+    height, width = cell_size(precision)
+    widest_latitude = min(90.0, abs(latitude) + height)
+    return min(
+        math.radians(height) * EARTH_RADIUS,
+        math.radians(width) * EARTH_RADIUS * math.cos(math.radians(widest_latitude)),
+    )
@@ -0,0 +1,150 @@
+import math
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+from django.utils.dateparse import parse_datetime
+from lxml import etree
+
+
+class GPXParseError(Exception):
+    pass
+
+
+class GPXSegment:
+    """
+    Points of one ``trkseg`` as columns. Missing elevations and times are stored as NaN,
+    times as POSIX timestamps. While parsing the columns are growing ``array("d")``,
+    :meth:`finish` turns them into numpy arrays sharing the same memory.
+    """
+
+    __slots__ = ("latitudes", "longitudes", "elevations", "times")
+
+    def __init__(self):
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.elevations = array("d")
+        self.times = array("d")
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def finish(self):
+        for column in self.__slots__:
+            setattr(self, column, np.frombuffer(getattr(self, column), dtype=np.float64))
+
+
+class GPXTrack:
+    __slots__ = ("name", "description", "segments")
+
+    def __init__(self):
+        self.name = None
+        self.description = None
+        self.segments = []
+
+
+class GPXData:
+    """Result of :func:`parse_gpx`, statistics are computed by :mod:`tours.utils.stats`."""
+
+    def __init__(self):
+        self.name = None
+        self.description = None
+        self.tracks = []
+
+    @property
+    def segments(self):
+        return [segment for track in self.tracks for segment in track.segments]
+
+    def get_time_bounds(self):
+        """Times of the first and the last point that have one."""
+        times = np.concatenate([segment.times for segment in self.segments] or [np.empty(0)])
+        times = times[~np.isnan(times)]
+        if not len(times):
+            return None, None
+        return datetime.fromtimestamp(times[0], timezone.utc), datetime.fromtimestamp(times[-1], timezone.utc)
+
+    def get_coordinates(self):
+        """All points as an ``(n, 2)`` array of longitude, latitude in file order."""
+        return np.concatenate(
+            [np.column_stack((segment.longitudes, segment.latitudes)) for segment in self.segments]
+            or [np.empty((0, 2))]
+        )
+
+
+def _local_name(element):
+    return element.tag.rpartition("}")[2]
+
+
+def _parse_time(value):
+    value = value.strip()
+    try:
+        # fast path for the common "2021-01-09T14:33:00Z" format
+        time = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        time = parse_datetime(value)
+        if time is None:
+            raise ValueError(f"Invalid time {value!r}")
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return time.timestamp()
+
+
+def parse_gpx(file):
+    """
+    Stream the tracks of a GPX 1.0 / 1.1 file into :class:`GPXData`.
+
+    Track points are read one element at a time and appended to typed arrays, every parsed
+    element is freed right away, so memory use stays proportional to the number of points
+    (32 bytes each) instead of the size of the XML tree. Routes and waypoints are skipped.
+    """
+    gpx = GPXData()
+    track = segment = None
+
+    # only these elements reach Python, lxml filters all others in C
+    tags = ("{*}trkpt", "{*}trkseg", "{*}trk", "{*}name", "{*}desc", "{*}wpt", "{*}rte")
+    context = etree.iterparse(file, tag=tags, resolve_entities=False, no_network=True, remove_comments=True)
+    try:
+        for _, element in context:
+            tag = _local_name(element)
+            if tag == "trkpt":
+                elevation, time = math.nan, math.nan
+                for child in element:
+                    child_tag = _local_name(child)
+                    if child_tag == "ele" and child.text and child.text.strip():
+                        elevation = float(child.text)
+                    elif child_tag == "time" and child.text and child.text.strip():
+                        time = _parse_time(child.text)
+                if segment is None:
+                    segment = GPXSegment()
+                segment.latitudes.append(float(element.get("lat")))
+                segment.longitudes.append(float(element.get("lon")))
+                segment.elevations.append(elevation)
+                segment.times.append(time)
+            elif tag in ("name", "desc"):
+                parent = _local_name(element.getparent())
+                if parent in ("gpx", "metadata", "trk"):
+                    if parent == "trk" and track is None:
+                        track = GPXTrack()
+                    target = track if parent == "trk" else gpx
+                    setattr(target, "name" if tag == "name" else "description", (element.text or "").strip() or None)
+            elif tag == "trkseg":
+                if track is None:
+                    track = GPXTrack()
+                if segment is not None:
+                    segment.finish()
+                    track.segments.append(segment)
+                segment = None
+            elif tag == "trk":
+                gpx.tracks.append(track or GPXTrack())
+                track = None
+
+            # free everything parsed so far, only the open ancestors stay in memory
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    except (etree.XMLSyntaxError, ValueError, TypeError) as e:
+        raise GPXParseError(str(e)) from e
+
+    if context.root is None or _local_name(context.root) != "gpx":
+        raise GPXParseError("Not a GPX file")
+    return gpx
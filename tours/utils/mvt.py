@@ -0,0 +1,162 @@
+import math
+
+import numpy as np
+
+# Mapbox Vector Tile 2.1 encoding of line layers, see https://github.com/mapbox/vector-tile-spec
+EXTENT = 4096
+BUFFER = 64
+VERSION = 2
+GEOMETRY_TYPE_LINESTRING = 2
+COMMAND_MOVE_TO = 1
+COMMAND_LINE_TO = 2
+
+WIRE_VARINT = 0
+WIRE_LENGTH_DELIMITED = 2
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _key(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _varint_field(number, value):
+    return _key(number, WIRE_VARINT) + _varint(value)
+
+
+def _bytes_field(number, data):
+    return _key(number, WIRE_LENGTH_DELIMITED) + _varint(len(data)) + data
+
+
+def _packed_field(number, values):
+    return _bytes_field(number, b"".join(_varint(value) for value in values))
+
+
+def _zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return (values << 1) ^ (values >> 63)
+
+
+def project(coordinates, z, x, y, extent=EXTENT):
+    """``(n, 2)`` longitude, latitude to web mercator coordinates inside tile ``z/x/y`` (y down)."""
+    scale = 2 ** z
+    latitudes = np.radians(np.clip(coordinates[:, 1], -85.0511, 85.0511))
+    tile_x = (coordinates[:, 0] + 180) / 360 * scale
+    tile_y = (1 - np.log(np.tan(latitudes) + 1 / np.cos(latitudes)) / math.pi) / 2 * scale
+    return np.column_stack(((tile_x - x) * extent, (tile_y - y) * extent))
+
+
+def tile_bbox(z, x, y, buffer=BUFFER / EXTENT):
+    """Longitude, latitude bounds ``(min_lon, min_lat, max_lon, max_lat)`` of tile ``z/x/y`` and its buffer."""
+    scale = 2 ** z
+
+    def longitude(tile_x):
+        return tile_x / scale * 360 - 180
+
+    def latitude(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / scale))))
+
+    return longitude(x - buffer), latitude(y + 1 + buffer), longitude(x + 1 + buffer), latitude(y - buffer)
+
+
+def clip_line(points, minimum=-BUFFER, maximum=EXTENT + BUFFER):
+    """
+    Liang-Barsky clipping of a line to the square ``minimum``..``maximum``, done for all segments at
+    once. Returns the parts of the line inside the square as integer ``(n, 2)`` arrays.
+    """
+    if len(points) < 2:
+        return []
+    start, delta = points[:-1], np.diff(points, axis=0)
+
+    t_enter = np.zeros(len(delta))
+    t_exit = np.ones(len(delta))
+    visible = np.ones(len(delta), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for axis in (0, 1):
+            for p, q in ((-delta[:, axis], start[:, axis] - minimum), (delta[:, axis], maximum - start[:, axis])):
+                visible &= (p != 0) | (q >= 0)
+                ratio = q / p
+                t_enter = np.where(p < 0, np.maximum(t_enter, ratio), t_enter)
+                t_exit = np.where(p > 0, np.minimum(t_exit, ratio), t_exit)
+    visible &= t_enter <= t_exit
+
+    indices = np.flatnonzero(visible)
+    if not len(indices):
+        return []
+    entries = start[indices] + t_enter[indices, None] * delta[indices]
+    exits = start[indices] + t_exit[indices, None] * delta[indices]
+
+    # a new part starts wherever the line left the square before, or segments were skipped
+    continues = np.zeros(len(indices), dtype=bool)
+    continues[1:] = (np.diff(indices) == 1) & (t_exit[indices[:-1]] == 1) & (t_enter[indices[1:]] == 0)
+    parts = []
+    for segment_indices in np.split(np.arange(len(indices)), np.flatnonzero(~continues)[1:]):
+        part = np.rint(np.vstack((entries[segment_indices[:1]], exits[segment_indices]))).astype(np.int64)
+        # drop points that collapse into the previous one after rounding
+        keep = np.ones(len(part), dtype=bool)
+        keep[1:] = np.any(part[1:] != part[:-1], axis=1)
+        part = part[keep]
+        if len(part) > 1:
+            parts.append(part)
+    return parts
+
+
+def encode_line_geometry(parts):
+    """Geometry commands of a (multi) line string made of integer tile coordinate ``parts``."""
+    commands = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for part in parts:
+        deltas = _zigzag(np.diff(np.vstack((cursor, part)), axis=0))
+        commands.append((COMMAND_MOVE_TO & 0x7) | (1 << 3))
+        commands.extend(deltas[0].tolist())
+        commands.append((COMMAND_LINE_TO & 0x7) | ((len(part) - 1) << 3))
+        commands.extend(deltas[1:].ravel().tolist())
+        cursor = part[-1]
+    return commands
+
+
+class Layer:
+    """A layer of line features with string properties, :meth:`encode` returns the protobuf message."""
+
+    def __init__(self, name, extent=EXTENT):
+        self.name = name
+        self.extent = extent
+        self.features = []
+        self.keys = {}
+        self.values = {}
+
+    def _tags(self, properties):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            tags.append(self.values.setdefault(str(value), len(self.values)))
+        return tags
+
+    def add_line(self, feature_id, parts, properties):
+        feature = _varint_field(1, feature_id)
+        feature += _packed_field(2, self._tags(properties))
+        feature += _varint_field(3, GEOMETRY_TYPE_LINESTRING)
+        feature += _packed_field(4, encode_line_geometry(parts))
+        self.features.append(feature)
+
+    def encode(self):
+        layer = _varint_field(15, VERSION) + _bytes_field(1, self.name.encode())
+        layer += b"".join(_bytes_field(2, feature) for feature in self.features)
+        layer += b"".join(_bytes_field(3, key.encode()) for key in self.keys)
+        layer += b"".join(_bytes_field(4, _bytes_field(1, value.encode())) for value in self.values)
+        layer += _varint_field(5, self.extent)
+        return layer
+
+
+def encode_tile(layers):
+    """A tile of the non-empty ``layers``."""
+    return b"".join(_bytes_field(3, layer.encode()) for layer in layers if layer.features)
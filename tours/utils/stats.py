@@ -0,0 +1,166 @@
+from collections import namedtuple
+
+import numpy as np
+
+# same constants as gpxpy, so results match what the mutations returned when they used gpxpy
+EARTH_RADIUS = 6378.137 * 1000
+ONE_DEGREE = (2 * np.pi * EARTH_RADIUS) / 360
+SMOOTHING_RATIO = (0.4, 0.2, 0.4)
+UPHILL_DOWNHILL_RATIO = (0.3, 0.4, 0.3)
+STOPPED_SPEED_THRESHOLD_KM_PER_H = 1
+
+TrackStatistics = namedtuple(
+    "TrackStatistics",
+    [
+        "distance_m",
+        "uphill_m",
+        "downhill_m",
+        "moving_time_s",
+        "stopped_time_s",
+        "moving_distance_m",
+        "stopped_distance_m",
+        "max_speed_m_per_s",
+        "avg_speed_m_per_s",
+    ],
+)
+
+
+def smooth_elevations(elevations):
+    """
+    Vertical smoothing as done by gpxpy's ``smooth(vertical=True, horizontal=False)``: every point whose
+    neighbours and itself have a (non-zero) elevation is replaced by a weighted average of the three.
+    """
+    smoothed = elevations.copy()
+    if len(elevations) <= 3:
+        return smoothed
+    filled = np.nan_to_num(elevations, nan=0.0)
+    previous, current, following = filled[:-2], filled[1:-1], filled[2:]
+    mask = (previous != 0) & (current != 0) & (following != 0)
+    averaged = SMOOTHING_RATIO[0] * previous + SMOOTHING_RATIO[1] * current + SMOOTHING_RATIO[2] * following
+    smoothed[1:-1][mask] = averaged[mask]
+    return smoothed
+
+
+def distances(latitudes_1, longitudes_1, latitudes_2, longitudes_2, elevations_1=None, elevations_2=None):
+    """
+    Pairwise distances in meters. Close points use gpxpy's flat earth approximation (3d where both
+    elevations are known and differ), points further apart than 0.2 degrees use the haversine formula.
+    """
+    d_latitudes = latitudes_1 - latitudes_2
+    d_longitudes = longitudes_1 - longitudes_2
+
+    flat = np.sqrt(d_latitudes ** 2 + (d_longitudes * np.cos(np.radians(latitudes_1))) ** 2) * ONE_DEGREE
+    if elevations_1 is not None:
+        d_elevations = np.nan_to_num(elevations_1 - elevations_2, nan=0.0)
+        flat = np.sqrt(flat ** 2 + d_elevations ** 2)
+
+    far = (np.abs(d_latitudes) > 0.2) | (np.abs(d_longitudes) > 0.2)
+    if far.any():
+        lat_1, lat_2 = np.radians(latitudes_1[far]), np.radians(latitudes_2[far])
+        a = np.sin((lat_1 - lat_2) / 2) ** 2 + np.sin(np.radians(d_longitudes[far]) / 2) ** 2 * np.cos(lat_1) * np.cos(
+            lat_2
+        )
+        flat[far] = EARTH_RADIUS * 2 * np.arcsin(np.sqrt(a))
+    return flat
+
+
+def uphill_downhill(elevations):
+    """Climb and descent in meters of the (0.3, 0.4, 0.3) filtered elevations, unknown elevations are skipped."""
+    elevations = elevations[~np.isnan(elevations)]
+    if len(elevations) < 2:
+        return 0.0, 0.0
+    filtered = elevations.copy()
+    filtered[1:-1] = (
+        UPHILL_DOWNHILL_RATIO[0] * elevations[:-2]
+        + UPHILL_DOWNHILL_RATIO[1] * elevations[1:-1]
+        + UPHILL_DOWNHILL_RATIO[2] * elevations[2:]
+    )
+    deltas = np.diff(filtered)
+    return float(deltas[deltas > 0].sum()), float(-deltas[deltas <= 0].sum())
+
+
+def max_speed_without_extremes(speeds, step_distances, extremes_percentile):
+    """
+    Ignores steps whose distance is more than 1.5 standard deviations from the mean and then the top
+    ``extremes_percentile`` of speeds, both are usually GPS errors.
+    """
+    if len(speeds) < 2:
+        return None
+    deviations = np.abs(step_distances - step_distances.mean())
+    speeds = np.sort(speeds[deviations <= step_distances.std() * 1.5])
+    if not len(speeds):
+        return None
+    index = int(len(speeds) * (1 - extremes_percentile))
+    return float(speeds[index if index < len(speeds) else -1])
+
+
+def segment_statistics(latitudes, longitudes, elevations, times, speed_extremes_percentile):
+    """:class:`TrackStatistics` of one segment, the elevations are expected to be smoothed already."""
+    distance_m = 0.0
+    if len(latitudes) > 1:
+        distance_m = float(distances(latitudes[1:], longitudes[1:], latitudes[:-1], longitudes[:-1]).sum())
+    uphill_m, downhill_m = uphill_downhill(elevations)
+
+    # moving data, computed on the steps between two timed points
+    seconds = np.diff(times)
+    with np.errstate(invalid="ignore"):
+        with_elevation = (elevations[1:] != 0) & (elevations[:-1] != 0) & ~np.isnan(elevations[1:] - elevations[:-1])
+    step_distances = distances(
+        latitudes[1:],
+        longitudes[1:],
+        latitudes[:-1],
+        longitudes[:-1],
+        np.where(with_elevation, elevations[1:], np.nan),
+        np.where(with_elevation, elevations[:-1], np.nan),
+    )
+    with np.errstate(invalid="ignore"):
+        counted = (seconds > 0) & (step_distances != 0)
+    seconds_or_one = np.where(counted, seconds, 1.0)
+    speeds = step_distances / seconds_or_one
+    stopped = counted & ((step_distances / 1000) / (seconds_or_one / 3600) <= STOPPED_SPEED_THRESHOLD_KM_PER_H)
+    moving = counted & ~stopped
+
+    moving_seconds = np.where(moving, seconds, 0.0)
+    # like gpxpy, speeds only count from the first moving step on
+    with_speed = counted & (np.cumsum(moving_seconds) > 0)
+    max_speed = max_speed_without_extremes(speeds[with_speed], step_distances[with_speed], speed_extremes_percentile)
+
+    moving_time_s = float(moving_seconds.sum())
+    moving_distance_m = float(step_distances[moving].sum())
+    return TrackStatistics(
+        distance_m=distance_m,
+        uphill_m=uphill_m,
+        downhill_m=downhill_m,
+        moving_time_s=moving_time_s,
+        stopped_time_s=float(seconds[stopped].sum()),
+        moving_distance_m=moving_distance_m,
+        stopped_distance_m=float(step_distances[stopped].sum()),
+        max_speed_m_per_s=max_speed or 0.0,
+        avg_speed_m_per_s=moving_distance_m / moving_time_s if moving_time_s > 0 else 0.0,
+    )
+
+
+def track_statistics(segments, speed_extremes_percentile=0.015):
+    """
+    Distance, climb, moving data and speeds of all ``segments``, after vertical smoothing.
+    Gives the same results as gpxpy's ``smooth``, ``length_2d``, ``get_uphill_downhill`` and
+    ``get_moving_data`` on the same file, without iterating over the points in Python.
+    """
+    totals = [0.0] * len(TrackStatistics._fields)
+    max_speed = 0.0
+    for segment in segments:
+        statistics = segment_statistics(
+            segment.latitudes,
+            segment.longitudes,
+            smooth_elevations(segment.elevations),
+            segment.times,
+            speed_extremes_percentile,
+        )
+        totals = [total + value for total, value in zip(totals, statistics)]
+        max_speed = max(max_speed, statistics.max_speed_m_per_s)
+
+    result = TrackStatistics(*totals)
+    return result._replace(
+        max_speed_m_per_s=max_speed,
+        avg_speed_m_per_s=result.moving_distance_m / result.moving_time_s if result.moving_time_s > 0 else 0.0,
+    )
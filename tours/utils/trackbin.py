@@ -0,0 +1,126 @@
+import numpy as np
+
+# Compact track geometry: "OTB" magic, a version and a flags byte, followed by zigzag varints.
+# The point count comes first, then one column per channel of delta encoded integers: longitudes and
+# latitudes in micro degrees and, if flagged, elevations in decimeters and POSIX times in seconds.
+MAGIC = b"OTB"
+VERSION = 1
+CONTENT_TYPE = "application/vnd.open-tours.track"
+EXTENSION = ".otb"
+
+FLAG_ELEVATION = 1
+FLAG_TIME = 2
+
+COORDINATE_SCALE = 1e6
+ELEVATION_SCALE = 10
+
+
+class TrackBinError(ValueError):
+    pass
+
+
+def _encode_varints(values):
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        lengths += values >= np.uint64(1 << shift)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for byte in range(int(lengths.max(initial=0))):
+        mask = lengths > byte
+        chunk = (values[mask] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+        more = (lengths[mask] > byte + 1).astype(np.uint64) << np.uint64(7)
+        out[offsets[mask] + byte] = chunk | more
+    return out.tobytes()
+
+
+def _decode_varints(data):
+    data = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    if len(data) and (not len(ends) or ends[-1] != len(data) - 1):
+        raise TrackBinError("Truncated varint")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    values = np.zeros(len(ends), dtype=np.uint64)
+    for byte in range(int(lengths.max(initial=0))):
+        mask = lengths > byte
+        values[mask] |= (data[starts[mask] + byte] & np.uint64(0x7F)).astype(np.uint64) << np.uint64(7 * byte)
+    return values
+
+
+def _zigzag(values):
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values):
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def _deltas(values):
+    return _zigzag(np.diff(values, prepend=0))
+
+
+def _fill_missing(values):
+    """Missing (NaN) values interpolated from their neighbors, ``None`` if all are missing."""
+    if values is None:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    known = ~np.isnan(values)
+    if not known.any():
+        return None
+    if known.all():
+        return values
+    positions = np.arange(len(values))
+    return np.interp(positions, positions[known], values[known])
+
+
+def encode(line, elevations=None, times=None):
+    """
+    Encode an ``(n, 2)`` longitude, latitude array, optionally with per point ``elevations`` in meters
+    and ``times`` as POSIX timestamps. Missing (NaN) values of a channel are interpolated,
+    a channel without any value is left out.
+    """
+    line = np.asarray(line, dtype=np.float64).reshape(-1, 2)
+    flags = 0
+    columns = [
+        np.array([len(line)], dtype=np.uint64),
+        _deltas(np.rint(line[:, 0] * COORDINATE_SCALE)),
+        _deltas(np.rint(line[:, 1] * COORDINATE_SCALE)),
+    ]
+    elevations, times = _fill_missing(elevations), _fill_missing(times)
+    if elevations is not None:
+        flags |= FLAG_ELEVATION
+        columns.append(_deltas(np.rint(elevations * ELEVATION_SCALE)))
+    if times is not None:
+        flags |= FLAG_TIME
+        columns.append(_deltas(np.rint(times)))
+    return MAGIC + bytes([VERSION, flags]) + _encode_varints(np.concatenate(columns))
+
+
+def decode(data):
+    """Inverse of :func:`encode`, returns ``(line, elevations, times)`` with ``None`` for left out channels."""
+    if data[:3] != MAGIC or len(data) < 5:
+        raise TrackBinError("Not a track geometry")
+    if data[3] != VERSION:
+        raise TrackBinError(f"Unsupported version {data[3]}")
+    flags = data[4]
+    values = _decode_varints(data[5:])
+    if not len(values):
+        raise TrackBinError("Missing point count")
+
+    count = int(values[0])
+    channels = 2 + bool(flags & FLAG_ELEVATION) + bool(flags & FLAG_TIME)
+    if len(values) != 1 + channels * count:
+        raise TrackBinError("Point count does not match the data")
+    columns = np.cumsum(_unzigzag(values[1:]).reshape(channels, count), axis=1)
+
+    line = np.column_stack((columns[0], columns[1])) / COORDINATE_SCALE
+    channel = 2
+    elevations = times = None
+    if flags & FLAG_ELEVATION:
+        elevations = columns[channel] / ELEVATION_SCALE
+        channel += 1
+    if flags & FLAG_TIME:
+        times = columns[channel].astype(np.float64)
+    return line, elevations, times
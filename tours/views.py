@@ -0,0 +1,89 @@
+import mimetypes
+
+from django.conf import settings as s
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET, require_safe
+
+from users.models import User
+
+from .assets import ASSET_NAME, ASSETS_DIR, ENCODINGS
+from .tiles import get_tile
+
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@require_GET
+def track_tile(request, z, x, y):
+    """Vector tile of the tracks of ``?user=<id>`` or ``?logbook=<subdomain>``."""
+    if request.GET.get("user"):
+        try:
+            user_id = int(request.GET["user"])
+        except ValueError:
+            raise Http404
+        user = get_object_or_404(User, pk=user_id)
+    elif request.GET.get("logbook"):
+        user = get_object_or_404(User, logbook_subdomain=request.GET["logbook"])
+    else:
+        raise Http404
+
+    if z > s.TILES_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        raise Http404
+
+    return HttpResponse(get_tile(user.pk, z, x, y), content_type=MVT_CONTENT_TYPE)
+
+
+def _accepted_encodings(request):
+    """Content codings of the ``Accept-Encoding`` header that are not refused with ``q=0``."""
+    accepted = set()
+    for coding in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        name, _, parameters = coding.strip().partition(";")
+        quality = parameters.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+@require_safe
+def geometry_asset(request, name):
+    """
+    Serve a content hashed geometry file, precompressed with the best encoding the client accepts.
+    The name never changes for other content, so responses are cached forever and revalidated by ETag.
+    """
+    match = ASSET_NAME.match(name)
+    if not match:
+        raise Http404
+    path = f"{ASSETS_DIR}/{name}"
+
+    accepted = _accepted_encodings(request)
+    encoding, suffix = None, ""
+    for candidate, candidate_suffix in ENCODINGS:
+        if (candidate in accepted or "*" in accepted) and default_storage.exists(f"{path}{candidate_suffix}"):
+            encoding, suffix = candidate, candidate_suffix
+            break
+    if encoding is None and not default_storage.exists(path):
+        raise Http404
+
+    # strong validators, one per representation
+    digest = match.group("digest")
+    etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+    etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+    if "*" in etags or etag in etags:
+        response = HttpResponseNotModified()
+    else:
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        response = FileResponse(default_storage.open(f"{path}{suffix}", "rb"), content_type=content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+    response["ETag"] = etag
+    response["Cache-Control"] = ASSET_CACHE_CONTROL
+    response["Vary"] = "Accept-Encoding"
+    return response
@@ -0,0 +1,20 @@
+from graphql_jwt.backends import JSONWebTokenBackend
+from graphql_jwt.shortcuts import get_user_by_token
+from graphql_jwt.utils import get_credentials
+
+
+class CachedJSONWebTokenBackend(JSONWebTokenBackend):
+    """Resolves a token to its user once per request, instead of once per authenticated resolver."""
+
+    def authenticate(self, request=None, **kwargs):
+        if request is None or getattr(request, "_jwt_token_auth", False):
+            return None
+
+        token = get_credentials(request, **kwargs)
+        if token is None:
+            return None
+
+        users = request.__dict__.setdefault("_jwt_users", {})
+        if token not in users:
+            users[token] = get_user_by_token(token, request)
+        return users[token]
@@ -0,0 +1,81 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings as s
+from django.db import connection
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils.timezone import now
+
+from utils.response_cache import GLOBAL_SCOPE, invalidate, owner_scope
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# user id -> time of the last login not written yet
+_pending = {}
+_lock = threading.Lock()
+_timer = None
+
+BATCH_SIZE = 500
+
+
+def record_login(user):
+    """
+    Set ``user.last_login`` and queue it for the next flush, at most ``LAST_LOGIN_FLUSH_INTERVAL`` seconds
+    later. Logins do not write, with an interval of 0 the login is written right away.
+    """
+    global _timer
+    user.last_login = now()
+    if not s.LAST_LOGIN_FLUSH_INTERVAL:
+        _write({user.pk: user.last_login})
+        return
+
+    with _lock:
+        _pending[user.pk] = user.last_login
+        if _timer is None:
+            _timer = threading.Timer(s.LAST_LOGIN_FLUSH_INTERVAL, _flush_in_thread)
+            _timer.daemon = True
+            _timer.start()
+
+
+def _flush_in_thread():
+    global _timer
+    with _lock:
+        _timer = None
+    try:
+        flush()
+    except Exception:
+        logger.exception("Writing last logins failed")
+    finally:
+        connection.close()
+
+
+def flush():
+    """Write the queued last logins, returns the number of users."""
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    if pending:
+        _write(pending)
+    return len(pending)
+
+
+def _write(logins):
+    """
+    One ``UPDATE ... SET last_login = CASE id WHEN ... END WHERE id IN`` per batch, so each user gets
+    their own login time. The users' cached public data is invalidated.
+    """
+    user_ids = sorted(logins)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start : start + BATCH_SIZE]
+        last_login = Case(
+            *(When(pk=user_id, then=Value(logins[user_id], output_field=DateTimeField())) for user_id in batch)
+        )
+        User.objects.filter(pk__in=batch).update(last_login=last_login)
+    invalidate(GLOBAL_SCOPE, *(owner_scope(user_id) for user_id in user_ids))
+
+
+# logins of the last interval are written when the process exits, they are lost if it is killed (SIGKILL)
+atexit.register(_flush_in_thread)
@@ -0,0 +1,12 @@
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from .models import User
+
+
+class UserLoader(DataLoader):
+    """Loads users by id with a single query, repeated ids are only fetched once."""
+
+    def batch_load_fn(self, user_ids):
+        users = User.objects.in_bulk(user_ids)
+        return Promise.resolve([users.get(user_id) for user_id in user_ids])
@@ -4,7 +4,8 @@ import uuid
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
 from django.utils import timezone
-from easy_thumbnails.files import get_thumbnailer
+
+from utils.thumbnails import get_thumbnail_url
 
 from .managers import UserManager
 
@@ -40,13 +41,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     def get_profile_image_url(self, request):
         if not self.profile_image:
             return
-        thumbnailer = get_thumbnailer(self.profile_image)
-        image_url_path = thumbnailer["small"].url
-        return request.build_absolute_uri(image_url_path)
+        return get_thumbnail_url(self.profile_image, "small", request)
 
     def get_logbook_header_image_url(self, request):
         if not self.logbook_header_image:
             return
-        thumbnailer = get_thumbnailer(self.logbook_header_image)
-        image_url_path = thumbnailer["scaled"].url
-        return request.build_absolute_uri(image_url_path)
+        return get_thumbnail_url(self.logbook_header_image, "scaled", request)
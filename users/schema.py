@@ -5,22 +5,32 @@ from django.conf import settings as s
 from django.db.models import FileField, ImageField
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
-from graphene import ID, Field, Int, List, Mutation, ObjectType, String
+from graphene import ID, Field, Int, Mutation, ObjectType, String
 from graphene_django.types import DjangoObjectType
 from graphene_file_upload.scalars import Upload
 from graphql import GraphQLError
 from graphql_jwt.decorators import login_required
 
+from tours.loaders import UserTrackStatsLoader
+from utils.graphene import get_loader, get_request_cache
+from utils.pagination import paginate
+
 from .forms import EmailUserCreationForm
 from .models import User
 
 
 class UserTypeBase:
     def resolve_profile_image(self, info):
-        return self.get_profile_image_url(info.context)
+        urls = get_request_cache(info, "profile_image_urls")
+        if self.pk not in urls:
+            urls[self.pk] = self.get_profile_image_url(info.context)
+        return urls[self.pk]
 
     def resolve_logbook_header_image(self, info):
-        return self.get_logbook_header_image_url(info.context)
+        urls = get_request_cache(info, "logbook_header_image_urls")
+        if self.pk not in urls:
+            urls[self.pk] = self.get_logbook_header_image_url(info.context)
+        return urls[self.pk]
 
 
 class UserPublicType(UserTypeBase, DjangoObjectType):
@@ -37,6 +47,12 @@ class UserPublicType(UserTypeBase, DjangoObjectType):
             "date_joined",
         )
 
+    stats = Field("tours.schema.UserTrackStatsType")  # avoid circular import
+
+    @staticmethod
+    def resolve_stats(self, info):
+        return get_loader(info, UserTrackStatsLoader).load(self.pk)
+
 
 class UserPrivateType(UserTypeBase, DjangoObjectType):
     class Meta:
@@ -58,7 +74,16 @@ class Logbook(ObjectType):
     subdomain = String()
     title = String()
     header_image = Upload()
-    tracks = List("tours.schema.TrackType")  # avoid circular import
+    tracks = Field("tours.schema.TrackConnection", first=Int(), after=String())  # avoid circular import
+    stats = Field("tours.schema.UserTrackStatsType")
+
+    @staticmethod
+    def resolve_tracks(self, info, first=None, after=None):
+        return paginate(info, self.tracks, ["start_date", "id"], first, after)
+
+    @staticmethod
+    def resolve_stats(self, info):
+        return get_loader(info, UserTrackStatsLoader).load(self.owner_id)
 
 
 class Query:
@@ -78,12 +103,15 @@ class Query:
     @staticmethod
     def resolve_logbook(self, info, **kwargs):
         user = get_object_or_404(User, logbook_subdomain=kwargs["subdomain"])
-        return Logbook(
+        logbook = Logbook(
             subdomain=user.logbook_subdomain,
             title=user.logbook_title,
             header_image=user.get_logbook_header_image_url(info.context),
             tracks=user.track_set.all(),
         )
+        # not a field, read by resolve_stats
+        logbook.owner_id = user.pk
+        return logbook
 
 
 class CreateUser(Mutation):
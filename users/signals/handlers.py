@@ -1,10 +1,23 @@
-from django.utils.timezone import now
+from django.db.models.signals import post_delete, post_save
 from graphql_jwt.signals import token_issued
 
+from utils.response_cache import invalidate_owner
+
+from ..last_login import record_login
+from ..models import User
+
 
 def update_last_login(**kwargs):
-    kwargs["user"].last_login = now()
-    kwargs["user"].save()
+    record_login(kwargs["user"])
 
 
 token_issued.connect(update_last_login)
+
+
+# drop the cached public GraphQL responses showing the user
+def response_cache_invalidate(sender, instance, **kwargs):
+    invalidate_owner(instance.pk)
+
+
+post_save.connect(response_cache_invalidate, sender=User)
+post_delete.connect(response_cache_invalidate, sender=User)
@@ -1,2 +1,32 @@
+from graphql.language import ast
+
+
 def field_name_to_readable(field):
     return field.replace("_", " ").title()
+
+
+def get_loader(info, loader_class):
+    """Return the instance of ``loader_class`` bound to the current request, creating it on first use."""
+    loaders = getattr(info.context, "loaders", None)
+    if loaders is None:
+        loaders = info.context.loaders = {}
+    if loader_class not in loaders:
+        loaders[loader_class] = loader_class()
+    return loaders[loader_class]
+
+
+def get_request_cache(info, name):
+    """Return a dict named ``name`` that lives as long as the current request."""
+    caches = getattr(info.context, "request_caches", None)
+    if caches is None:
+        caches = info.context.request_caches = {}
+    return caches.setdefault(name, {})
+
+
+def get_argument_value(node, name, variables):
+    """Value of the argument ``name`` of a field ``node``, looked up in ``variables`` if it is a variable."""
+    for argument in node.arguments:
+        if argument.name.value == name:
+            if isinstance(argument.value, ast.Variable):
+                return (variables or {}).get(argument.value.name.value)
+            return getattr(argument.value, "value", None)
@@ -0,0 +1,46 @@
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.execution import ExecutionResult
+from graphql.validation import validate
+
+
+def _invalid_document(errors, *args, **kwargs):
+    return ExecutionResult(errors=errors, invalid=True)
+
+
+class CachedDocumentBackend(GraphQLCoreBackend):
+    """
+    Backend keeping the last ``size`` parsed and validated documents by query string, a cached document
+    executes without being parsed or validated again. Documents failing validation are cached with their
+    errors, syntax errors are raised and not cached.
+    """
+
+    def __init__(self, size, executor=None):
+        super().__init__(executor)
+        self.size = size
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def document_from_string(self, schema, document_string):
+        key = (id(schema), document_string)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                return document
+
+        document = super().document_from_string(schema, document_string)
+        errors = validate(schema, document.document_ast)
+        if errors:
+            document.execute = partial(_invalid_document, errors)
+        else:
+            document.execute = partial(document.execute, validate=False)
+
+        with self._lock:
+            self._documents[key] = document
+            while len(self._documents) > self.size:
+                self._documents.popitem(last=False)
+        return document
@@ -0,0 +1,307 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings as s
+
+logger = logging.getLogger(__name__)
+
+# Metrics in the Prometheus text format. Every gunicorn worker records into its own registry and writes it
+# to a file in METRICS_DIR at most METRICS_WRITE_INTERVAL seconds later, a scrape of any worker adds up the
+# files of all of them. Files of exited workers are kept so counters never go back, clear the directory when
+# the server is started. Without METRICS_DIR only the scraped worker is reported, supported for a single one.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# label sets per metric, further ones are counted as "other" so clients can not grow the registry
+MAX_SERIES = 500
+OTHER = "other"
+
+registry = []
+
+_write_lock = threading.Lock()
+_timer = None
+# the file name of this process, renamed after a fork so workers never share one
+_file = None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _get_series(self, labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            if len(self._series) >= MAX_SERIES:
+                key = (OTHER,) * len(self.labels)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = self._new_series()
+        return series
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def _changed(self):
+        if s.METRICS_DIR:
+            schedule_write()
+
+    def snapshot(self):
+        """Copy of the series as ``[labels, value]`` pairs, written to the file of the process as JSON."""
+        with self._lock:
+            return [[list(key), copy.deepcopy(value)] for key, value in self._series.items()]
+
+    @staticmethod
+    def merge(value, other):
+        raise NotImplementedError
+
+    def render(self, series):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key, value in sorted(series.items()):
+            lines.extend(self._render_series(key, value))
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_series(self):
+        return [0.0]
+
+    def inc(self, value=1, **labels):
+        with self._lock:
+            self._get_series(labels)[0] += value
+        self._changed()
+
+    def get(self, **labels):
+        with self._lock:
+            return self._get_series(labels)[0]
+
+    @staticmethod
+    def merge(value, other):
+        return [value[0] + other[0]]
+
+    def _render_series(self, key, value):
+        yield f"{self.name}{_format_labels(self.labels, key)} {value[0]:g}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def _new_series(self):
+        # counts per bucket (the last one is +Inf), sum
+        return [[0] * (len(self.buckets) + 1), 0.0]
+
+    def observe(self, value, **labels):
+        with self._lock:
+            series = self._get_series(labels)
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+        self._changed()
+
+    @staticmethod
+    def merge(value, other):
+        return [[count + other_count for count, other_count in zip(value[0], other[0])], value[1] + other[1]]
+
+    def _render_series(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', le)])} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(self.labels, key)} {total:g}"
+        yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+def snapshot():
+    return {metric.name: metric.snapshot() for metric in registry}
+
+
+def schedule_write():
+    global _timer
+    with _write_lock:
+        if _timer is None:
+            _timer = threading.Timer(s.METRICS_WRITE_INTERVAL, _write_in_thread)
+            _timer.daemon = True
+            _timer.start()
+
+
+def _write_in_thread():
+    global _timer
+    with _write_lock:
+        _timer = None
+    try:
+        write()
+    except Exception:
+        logger.exception("Writing metrics failed")
+
+
+def write():
+    """Write the metrics of this process to its file in ``METRICS_DIR``."""
+    global _file
+    directory = Path(s.METRICS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    content = json.dumps(snapshot()).encode()
+    with _write_lock:
+        pid = os.getpid()
+        if _file is None or _file[0] != pid:
+            _file = (pid, f"{pid}-{uuid.uuid4().hex}.json")
+        fd, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(temporary_path, directory.joinpath(_file[1]))
+
+
+def _read_snapshots():
+    write()
+    for path in Path(s.METRICS_DIR).glob("*.json"):
+        try:
+            yield json.loads(path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            pass
+
+
+def render():
+    """All metrics of all processes sharing ``METRICS_DIR`` in the Prometheus text exposition format."""
+    snapshots = _read_snapshots() if s.METRICS_DIR else [snapshot()]
+    series = defaultdict(dict)
+    for process in snapshots:
+        for metric in registry:
+            merged = series[metric.name]
+            for key, value in process.get(metric.name, []):
+                key = tuple(key)
+                merged[key] = metric.merge(merged[key], value) if key in merged else value
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render(series[metric.name]))
+    return "\n".join(lines) + "\n"
+
+
+def _write_at_exit():
+    if s.METRICS_DIR and _timer is not None:
+        write()
+
+
+# the last interval is written when the process exits, it is lost if it is killed (SIGKILL)
+atexit.register(_write_at_exit)
+
+
+operation_seconds = Histogram(
+    "graphql_operation_seconds", "Execution time of GraphQL operations.", ["operation", "type"]
+)
+operation_errors = Counter(
+    "graphql_operation_errors_total", "GraphQL operations answered with errors.", ["operation", "type"]
+)
+operation_queries = Counter(
+    "graphql_db_queries_total", "Database queries run by GraphQL operations.", ["operation", "type"]
+)
+operation_query_seconds = Counter(
+    "graphql_db_query_seconds_total", "Time spent in database queries of GraphQL operations.", ["operation", "type"]
+)
+field_seconds = Histogram("graphql_field_seconds", "Time until GraphQL fields are resolved.", ["field"])
+thumbnail_seconds = Histogram(
+    "thumbnail_render_seconds",
+    "Render time of thumbnails.",
+    ["alias"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+class OperationMetrics:
+    """
+    Database queries and, if ``fields`` is set, field timings of one GraphQL operation. Installed with
+    ``connection.execute_wrapper`` and kept on the request for :class:`MetricsMiddleware`.
+    """
+
+    def __init__(self, fields=False):
+        self.start = time.perf_counter()
+        self.duration = None
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.fields = defaultdict(lambda: [0, 0.0]) if fields else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - start
+
+    def add_field(self, field, seconds):
+        if self.fields is not None:
+            self.fields[field][0] += 1
+            self.fields[field][1] += seconds
+
+    def record(self, operation, operation_type, errors):
+        labels = {"operation": operation, "type": operation_type}
+        self.duration = time.perf_counter() - self.start
+        operation_seconds.observe(self.duration, **labels)
+        operation_queries.inc(self.queries, **labels)
+        operation_query_seconds.inc(self.query_seconds, **labels)
+        if errors:
+            operation_errors.inc(**labels)
+
+    def as_extension(self):
+        extension = {
+            "duration": round(self.duration, 6),
+            "queries": self.queries,
+            "queryDuration": round(self.query_seconds, 6),
+        }
+        if self.fields is not None:
+            extension["fields"] = {
+                field: {"count": count, "duration": round(seconds, 6)}
+                for field, (count, seconds) in sorted(self.fields.items(), key=lambda item: -item[1][1])
+            }
+        return extension
+
+
+class MetricsMiddleware:
+    """Graphene middleware timing every field until its value, or the promise for it, is resolved."""
+
+    def resolve(self, next, root, info, **args):
+        start = time.perf_counter()
+        result = next(root, info, **args)
+        field = f"{info.parent_type.name}.{info.field_name}"
+
+        def record(value):
+            seconds = time.perf_counter() - start
+            field_seconds.observe(seconds, field=field)
+            metrics = getattr(info.context, "graphql_metrics", None)
+            if metrics is not None:
+                metrics.add_field(field, seconds)
+            return value
+
+        if getattr(result, "is_pending", False):
+            return result.then(record)
+        record(result)
+        return result
@@ -0,0 +1,93 @@
+import base64
+import json
+
+from django.conf import settings as s
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from graphene.relay import PageInfo
+from graphql import GraphQLError
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+
+def decode_cursor(cursor, model, ordering):
+    """Values of the ``ordering`` fields of ``model`` in ``cursor``, converted to their Python types."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise GraphQLError(_("Invalid cursor"))
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise GraphQLError(_("Invalid cursor"))
+
+    converted = []
+    for name, value in zip(ordering, values):
+        field = model._meta.get_field(name.lstrip("-"))
+        try:
+            value = field.to_python(value)
+            # e.g. integers out of the column's range
+            field.run_validators(value)
+        except (ValidationError, TypeError, ValueError):
+            raise GraphQLError(_("Invalid cursor"))
+        if value is None:
+            raise GraphQLError(_("Invalid cursor"))
+        converted.append(value)
+    return converted
+
+
+def keyset_filter(ordering, values):
+    """
+    Build the WHERE clause selecting all rows after ``values`` in ``ordering``,
+    e.g. ``start_date > d OR (start_date = d AND id > i)`` for ``["start_date", "id"]``.
+    The leading column is additionally bounded so the composite index can be used as a range scan.
+    """
+    after = Q()
+    for i, field in enumerate(ordering):
+        condition = Q(**{f"{field.lstrip('-')}__{'lt' if field.startswith('-') else 'gt'}": values[i]})
+        for previous_field, previous_value in zip(ordering[:i], values[:i]):
+            condition &= Q(**{previous_field.lstrip("-"): previous_value})
+        after |= condition
+
+    leading_field = ordering[0]
+    leading_lookup = "lte" if leading_field.startswith("-") else "gte"
+    return Q(**{f"{leading_field.lstrip('-')}__{leading_lookup}": values[0]}) & after
+
+
+def paginate(info, queryset, ordering, first=None, after=None):
+    """
+    Return one page of ``queryset`` as the relay connection the current field resolves to.
+    Pages are selected with a keyset WHERE clause on ``ordering`` instead of an OFFSET,
+    so fetching a deep page costs the same as fetching the first one. The ``ordering`` columns must be
+    covered by an index on the queried table, so polymorphic children are paginated through their base model.
+    """
+    if first is None:
+        first = s.PAGINATION_DEFAULT_PAGE_SIZE
+    if first < 0:
+        raise GraphQLError(_("first can not be negative"))
+    first = min(first, s.PAGINATION_MAX_PAGE_SIZE)
+
+    queryset = queryset.order_by(*ordering)
+    if after:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(after, queryset.model, ordering)))
+
+    nodes = list(queryset[: first + 1])
+    has_next_page = len(nodes) > first
+    nodes = nodes[:first]
+
+    connection_type = info.return_type.graphene_type
+    edges = [
+        connection_type.Edge(node=node, cursor=encode_cursor([getattr(node, f.lstrip("-")) for f in ordering]))
+        for node in nodes
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=bool(after),
+            has_next_page=has_next_page,
+        ),
+    )
@@ -0,0 +1,130 @@
+from django.conf import settings as s
+from django.utils.translation import gettext_lazy as _
+from graphql import GraphQLError
+from graphql.language import ast
+from graphql.type.definition import GraphQLList, GraphQLObjectType, get_named_type, get_nullable_type
+
+from utils.graphene import get_argument_value
+
+
+def _is_connection(graphql_type):
+    return isinstance(graphql_type, GraphQLObjectType) and {"edges", "pageInfo"} <= set(graphql_type.fields)
+
+
+def _page_size(node, variables):
+    """Number of items a connection or list field with a ``first`` argument returns at most."""
+    try:
+        first = int(get_argument_value(node, "first", variables))
+    except (TypeError, ValueError):
+        return s.PAGINATION_DEFAULT_PAGE_SIZE
+    return max(0, min(first, s.PAGINATION_MAX_PAGE_SIZE))
+
+
+class _Analysis:
+    def __init__(self, schema, document, variables):
+        self.schema = schema
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+        self.variables = variables
+
+    def field_size(self, parent_type, node, field_type):
+        """Factor the cost of the selections below a field is multiplied with."""
+        if _is_connection(field_type):
+            return _page_size(node, self.variables)
+        if isinstance(get_nullable_type(field_type), GraphQLList):
+            if node.name.value == "edges" and _is_connection(parent_type):
+                # counted by the connection field
+                return 1
+            if any(argument.name.value == "first" for argument in node.arguments):
+                return _page_size(node, self.variables)
+            return s.GRAPHQL_LIST_SIZE
+        return 1
+
+    def selection_set(self, parent_type, selection_set, multiplier, visited):
+        """``(depth, cost)`` of a selection set, returning ``multiplier`` times of ``parent_type``."""
+        depth = cost = 0
+        for selection in selection_set.selections if selection_set else []:
+            if isinstance(selection, ast.Field):
+                name = selection.name.value
+                field = getattr(parent_type, "fields", {}).get(name)
+                if name.startswith("__") or field is None:
+                    # introspection is bounded by the schema, unknown fields fail validation
+                    continue
+                named_type = get_named_type(field.type)
+                default_cost = 1 if selection.selection_set else 0
+                field_cost = s.GRAPHQL_FIELD_COSTS.get(f"{parent_type.name}.{name}", default_cost) * multiplier
+                size = self.field_size(parent_type, selection, field.type)
+                child_depth, child_cost = self.selection_set(
+                    named_type, selection.selection_set, multiplier * size, visited
+                )
+                depth = max(depth, child_depth + 1)
+                cost += field_cost + child_cost
+            else:
+                fragment, fragment_visited = selection, visited
+                if isinstance(selection, ast.FragmentSpread):
+                    name = selection.name.value
+                    fragment = self.fragments.get(name)
+                    if fragment is None or name in visited:
+                        continue
+                    fragment_visited = visited | {name}
+                fragment_type = parent_type
+                if fragment.type_condition is not None:
+                    fragment_type = self.schema.get_type(fragment.type_condition.name.value) or parent_type
+                child_depth, child_cost = self.selection_set(
+                    fragment_type, fragment.selection_set, multiplier, fragment_visited
+                )
+                depth = max(depth, child_depth)
+                cost += child_cost
+        return depth, cost
+
+
+def get_operation(document, operation_name):
+    operations = [definition for definition in document.definitions if isinstance(definition, ast.OperationDefinition)]
+    if operation_name is None:
+        return operations[0] if len(operations) == 1 else None
+    return next(
+        (operation for operation in operations if operation.name and operation.name.value == operation_name), None
+    )
+
+
+def analyze(schema, document, operation_name=None, variables=None):
+    """
+    ``(depth, cost)`` of an operation, without resolving anything. Every field costs its weight in
+    ``GRAPHQL_FIELD_COSTS`` (``"Type.field"``), 1 for objects and 0 for scalars, times the number of
+    parent objects. Connections return ``first`` items, other lists :data:`GRAPHQL_LIST_SIZE`.
+    """
+    operation = get_operation(document, operation_name)
+    if operation is None:
+        return 0, 0
+    root_type = {
+        "query": schema.get_query_type(),
+        "mutation": schema.get_mutation_type(),
+        "subscription": schema.get_subscription_type(),
+    }.get(operation.operation)
+    if root_type is None:
+        return 0, 0
+    return _Analysis(schema, document, variables).selection_set(root_type, operation.selection_set, 1, frozenset())
+
+
+def check_query_cost(schema, document, operation_name=None, variables=None):
+    """Errors for operations exceeding ``GRAPHQL_MAX_QUERY_DEPTH`` or ``GRAPHQL_MAX_QUERY_COST``."""
+    depth, cost = analyze(schema, document, operation_name, variables)
+    errors = []
+    if depth > s.GRAPHQL_MAX_QUERY_DEPTH:
+        errors.append(
+            GraphQLError(
+                _("Query is nested too deeply (%(depth)d levels, at most %(max)d allowed)")
+                % {"depth": depth, "max": s.GRAPHQL_MAX_QUERY_DEPTH}
+            )
+        )
+    if cost > s.GRAPHQL_MAX_QUERY_COST:
+        errors.append(
+            GraphQLError(
+                _("Query is too expensive (cost %(cost)d, at most %(max)d allowed)")
+                % {"cost": cost, "max": s.GRAPHQL_MAX_QUERY_COST}
+            )
+        )
+    return errors
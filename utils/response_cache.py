@@ -0,0 +1,75 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings as s
+from django.core.cache import caches
+from django.db import transaction
+
+from utils.metrics import Counter
+
+# Responses are stored under the generations of the scopes they depend on, invalidating a scope
+# replaces its generation so the old entries are never read again and expire with their timeout.
+GLOBAL_SCOPE = "global"
+KEY_PREFIX = "graphql-response"
+
+lookups = Counter("graphql_response_cache_lookups_total", "Lookups in the GraphQL response cache.", ["result"])
+
+
+def _cache():
+    return caches[s.GRAPHQL_RESPONSE_CACHE]
+
+
+def owner_scope(owner_id):
+    return f"owner:{owner_id}"
+
+
+def _generation_key(scope):
+    return f"{KEY_PREFIX}:generation:{scope}"
+
+
+def _generations(scopes):
+    cache = _cache()
+    keys = {scope: _generation_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    generations = {}
+    for scope, key in keys.items():
+        if key not in found:
+            # lost or never set, start a new generation unless another process just did
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = cache.get(key)
+        generations[scope] = found[key]
+    return generations
+
+
+def response_key(query, variables, operation_name, scopes, pretty=False):
+    """
+    Cache key of a normalized ``query`` with its ``variables`` under the current generations of ``scopes``,
+    ``pretty`` printed responses are kept apart.
+    """
+    generations = _generations(sorted(set(scopes)))
+    payload = json.dumps([query, variables, operation_name, generations, pretty], sort_keys=True, default=str)
+    return f"{KEY_PREFIX}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+def get_response(key):
+    response = _cache().get(key)
+    lookups.inc(result="hit" if response is not None else "miss")
+    return response
+
+
+def set_response(key, response):
+    _cache().set(key, response, timeout=s.GRAPHQL_RESPONSE_CACHE_TIMEOUT)
+
+
+def invalidate(*scopes):
+    cache = _cache()
+    cache.set_many({_generation_key(scope): uuid.uuid4().hex for scope in scopes}, timeout=None)
+
+
+def invalidate_owner(owner_id):
+    """
+    Invalidate the cached responses of ``owner_id`` and all listings once the current transaction
+    commits, invalidating before would let a concurrent request cache the old rows again.
+    """
+    transaction.on_commit(lambda: invalidate(owner_scope(owner_id), GLOBAL_SCOPE))
@@ -0,0 +1,120 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings as s
+from django.core.files.storage import default_storage
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+
+from utils.metrics import thumbnail_seconds
+from utils.workers import get_worker_settings, setup_worker
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+# (source name, thumbnail name) -> future of the render, so every thumbnail is rendered once at a time
+_pending = {}
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn instead of fork, forking a process with open database connections and threads is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=s.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=setup_worker,
+            initargs=get_worker_settings(),
+        )
+    return _executor
+
+
+def _reset_executor():
+    global _executor
+    _executor = None
+
+
+def shutdown_executor():
+    """Wait for the scheduled thumbnails and stop the pool, a new one is started when needed."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def _get_options(thumbnailer, alias):
+    options = aliases.get(alias, target=thumbnailer.alias_target)
+    if not options:
+        raise KeyError(alias)
+    options["ALIAS"] = alias
+    return thumbnailer.get_options(options)
+
+
+def render_thumbnail(name, options):
+    """
+    Render and save the thumbnail of the default storage file ``name``, runs in the pool's processes.
+    Returns the render time, recorded by the scheduling process.
+    """
+    start = time.perf_counter()
+    get_thumbnailer(default_storage, name).get_thumbnail(options)
+    return time.perf_counter() - start
+
+
+def _forget(key, alias, future):
+    with _lock:
+        _pending.pop(key, None)
+    if future.cancelled():
+        return
+    if future.exception():
+        logger.error("Rendering thumbnail %s of %s failed", key[1], key[0], exc_info=future.exception())
+    else:
+        thumbnail_seconds.observe(future.result(), alias=alias)
+
+
+def schedule_thumbnails(fieldfile, alias_names=None):
+    """
+    Render the thumbnails ``alias_names`` (all aliases of the field by default) of ``fieldfile`` in the
+    thumbnail process pool. Thumbnails that are being rendered already are not scheduled again.
+    With ``THUMBNAIL_WORKERS = 0`` they are rendered right away in the current process.
+    """
+    thumbnailer = get_thumbnailer(fieldfile)
+    if alias_names is None:
+        alias_names = aliases.all(fieldfile, include_global=True).keys()
+
+    for alias in alias_names:
+        options = _get_options(thumbnailer, alias)
+        if not s.THUMBNAIL_WORKERS:
+            thumbnail_seconds.observe(render_thumbnail(fieldfile.name, options), alias=alias)
+            continue
+
+        key = (fieldfile.name, thumbnailer.get_thumbnail_name(options))
+        with _lock:
+            if key in _pending:
+                continue
+            try:
+                future = _get_executor().submit(render_thumbnail, fieldfile.name, options)
+            except BrokenProcessPool:
+                # a worker died, start a new pool next time
+                _reset_executor()
+                logger.exception("Thumbnail pool is broken, %s of %s not rendered", alias, fieldfile.name)
+                continue
+            _pending[key] = future
+        future.add_done_callback(lambda future, key=key, alias=alias: _forget(key, alias, future))
+
+
+def get_thumbnail_url(fieldfile, alias, request):
+    """
+    Absolute url of the ``alias`` thumbnail of ``fieldfile``. Thumbnails are never rendered in the request,
+    a missing one is scheduled and the url of the original file is returned until it is ready.
+    """
+    thumbnailer = get_thumbnailer(fieldfile)
+    thumbnail = thumbnailer.get_existing_thumbnail(_get_options(thumbnailer, alias))
+    if thumbnail:
+        return request.build_absolute_uri(thumbnail.url)
+    schedule_thumbnails(fieldfile, [alias])
+    return request.build_absolute_uri(fieldfile.url)
@@ -0,0 +1,20 @@
+import django
+from django.conf import settings as s
+from django.db import connections
+
+
+def get_worker_settings():
+    """Arguments of :func:`setup_worker` for a process started by the current one."""
+    return s.MEDIA_ROOT, {alias: connections[alias].settings_dict["NAME"] for alias in connections}
+
+
+def setup_worker(media_root, database_names):
+    """
+    Set up Django in a spawned pool process with the media root and databases of the process that started
+    the pool, which differ from the settings module in tests and load tests. Imports no models, so it can be
+    unpickled before the app registry is ready.
+    """
+    django.setup()
+    s.MEDIA_ROOT = media_root
+    for alias, name in database_names.items():
+        connections[alias].settings_dict["NAME"] = name